@@ -0,0 +1,72 @@
+"""
+Benchmark of the parallel rendering of a track.
+
+It renders a random track with an increasing number of threads and prints
+the time and the speedup for each number of threads. For example:
+
+    python3 bench_render.py --size 50 --dpi 20 --workers 1 2 4 8
+
+With --cold, the tile cache is emptied before each render, so the tiles
+are decoded and resized during the render.
+
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+# The package is imported from the checkout if it is not installed
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from line_track_designer.tile import Tile, tile_cache  # noqa: E402
+from line_track_designer.track import Track  # noqa: E402
+
+
+def random_track(nrow, ncol, seed=0):
+    """Return a random track of nrow rows and ncol columns."""
+    rng = np.random.RandomState(seed)
+    numbers = [i for i in range(2, 34) if Tile.is_valid(i)]
+    tiles = rng.choice(numbers, (nrow, ncol))
+    orient = rng.randint(0, 4, (nrow, ncol))
+    return Track(tiles, orient)
+
+
+def bench(track, dpi, workers, repeat, cold=False):
+    """Return the best time to render the track."""
+    times = []
+    for _ in range(repeat):
+        t = Track(track.tiles, track.orient)
+        if cold:
+            tile_cache.clear()
+        start = time.perf_counter()
+        t.export_img(dpi=dpi, workers=workers)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--size', type=int, default=50,
+                        help='number of rows and columns')
+    parser.add_argument('--dpi', type=int, default=20,
+                        help='resolution of the image')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[1, 2, 4, 8], help='numbers of threads')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of renders for each test')
+    parser.add_argument('--cold', action='store_true',
+                        help='empty the tile cache before each render')
+    args = parser.parse_args()
+
+    track = random_track(args.size, args.size)
+    # Warm the tile cache so that only the rendering is measured
+    tile_cache.maxbytes = None
+    track.export_img(dpi=args.dpi)
+    print('{}x{} track, {} dpi, {} CPUs'.format(
+        args.size, args.size, args.dpi, os.cpu_count()))
+    ref = None
+    for workers in args.workers:
+        t = bench(track, args.dpi, workers, args.repeat, args.cold)
+        ref = ref or t
+        print('{:2d} workers: {:.3f} s (speedup: {:.2f})'.format(
+            workers, t, ref / t))
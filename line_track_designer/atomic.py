@@ -0,0 +1,52 @@
+"""
+The **atomic** module replaces files atomically: the content is written
+in a temporary file of the same directory, which is then renamed over
+the file. A reader never sees a partial file, and the file is unchanged
+if the writing fails.
+
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+
+def _umask():
+    """Return the umask of the process."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def atomic_write(file, write):
+    """
+    Write a file atomically. The file keeps its mode if it exists, else
+    it gets the mode of a new file (0o666 without the umask). The
+    temporary file is removed if write fails.
+
+    For example, to save a track:
+
+    .. code-block:: python
+
+        atomic_write('track.txt', track.save)
+
+    Args:
+        file (str): filename
+        write (function): called with the name of the temporary file,
+            which has the extension of the file
+
+    """
+    p = Path(file)
+    fd, tmp = tempfile.mkstemp(dir=p.parent, prefix='.', suffix=p.suffix)
+    os.close(fd)
+    try:
+        write(tmp)
+        # The temporary file is only readable by the user
+        if p.exists():
+            shutil.copymode(p, tmp)
+        else:
+            os.chmod(tmp, 0o666 & ~_umask())
+        os.replace(tmp, p)
+    except BaseException:
+        os.remove(tmp)
+        raise
@@ -0,0 +1,174 @@
+"""
+The **batch** module exports many tracks at once. The files are shared
+between the processes of a pool, and each process keeps its tile cache
+warm from one track to the next.
+
+"""
+import os
+import logging
+from pathlib import Path
+from line_track_designer.error import LineTrackDesignerError
+
+FORMATS = ('png', 'md', 'trk', 'txt')
+
+
+def find_tracks(paths):
+    """
+    Return the track files given by a list of files and directories.
+    The text (.txt) and binary (.trk) files of the directories are
+    added in alphabetical order.
+
+    Args:
+        paths (list of str): files and directories
+
+    Returns:
+        list of Path: track files
+
+    """
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(
+                p for p in path.iterdir()
+                if p.is_file() and p.suffix in ['.txt', '.trk']))
+        else:
+            files.append(path)
+    return files
+
+
+def _outputs(file, formats, output=None):
+    """
+    Return the files written by the export of a track file. The md
+    format also writes the PNG image, and the track file itself is
+    skipped.
+    """
+    file = Path(file)
+    directory = file.parent if output is None else Path(output)
+    dests = []
+    for f in formats:
+        for ext in ['png', f] if f == 'md' else [f]:
+            dest = directory / '{}.{}'.format(file.stem, ext)
+            if dest not in dests and dest.resolve() != file.resolve():
+                dests.append(dest)
+    return dests
+
+
+def export_track(file, formats, output=None, cache=True):
+    """
+    Export a track file to several formats. The format of the track
+    file itself is skipped if it would be written over the file. The
+    PNG image is rendered once if both png and md formats are exported.
+
+    Args:
+        file (str): filename of the track
+        formats (list of str): formats to export ('png', 'md', 'trk',
+            'txt')
+        output (str): output directory (default: directory of the file)
+        cache (bool): use the render cache if True
+
+    Returns:
+        list of Path: files created (with the PNG image of the md file)
+
+    Raises:
+        LineTrackDesignerError: invalid format
+
+    """
+    # Imported here so that the CLI can use FORMATS without loading NumPy
+    from line_track_designer.track import Track
+    from line_track_designer.cache import RenderCache
+    file = Path(file)
+    for f in formats:
+        if f not in FORMATS:
+            raise LineTrackDesignerError('invalid format: {}'.format(f))
+    track = Track.read(str(file), file.stem)
+    directory = file.parent if output is None else Path(output)
+    render_cache = RenderCache() if cache else None
+    created = []
+    for f in formats:
+        dest = directory / '{}.{}'.format(file.stem, f)
+        if dest.resolve() == file.resolve():
+            logging.info('{} skipped: it is the track file'.format(dest))
+            continue
+        if dest in created:
+            continue
+        if f == 'png':
+            track.save_img(str(dest), cache=render_cache)
+        elif f == 'md':
+            # The image of the md file may already be saved
+            png = dest.with_suffix('.png')
+            track.save_md(str(dest), cache=render_cache,
+                          image=png not in created)
+            if png not in created:
+                created.append(png)
+        else:
+            track.save(str(dest))
+        created.append(dest)
+    return created
+
+
+def _export(args):
+    """Export a track and catch the error (run by the workers)."""
+    file = args[0]
+    try:
+        return file, export_track(*args), None
+    except Exception as e:
+        return file, [], '{}: {}'.format(type(e).__name__, e)
+
+
+def _run(tasks, jobs):
+    """Export the tracks of the tasks in order with jobs processes."""
+    if jobs == 1 or len(tasks) <= 1:
+        yield from map(_export, tasks)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(min(jobs, len(tasks))) as executor:
+            yield from executor.map(_export, tasks)
+
+
+def batch_export(paths, formats, output=None, jobs=None, cache=True):
+    """
+    Export many tracks with a pool of processes. The results are
+    generated in the order of the files. An error on a file doesn't stop
+    the export of the other files.
+
+    A file fails without being exported if it would write over a track
+    file or over a file exported from a previous track (for example
+    a/track.txt and b/track.txt with the same output directory).
+
+    Args:
+        paths (list of str): track files and directories
+        formats (list of str): formats to export
+        output (str): output directory (default: directory of each file)
+        jobs (int): number of processes (default: number of CPUs).
+            With one job, the tracks are exported in the current process.
+        cache (bool): use the render cache if True
+
+    Yields:
+        tuple: file, list of files created and error message (or None)
+
+    """
+    files = find_tracks(paths)
+    if output is not None:
+        os.makedirs(output, exist_ok=True)
+    # Each output belongs to the first track writing it
+    owners = {f.resolve(): f for f in files}
+    errors = {}
+    for f in files:
+        dests = [d.resolve() for d in _outputs(f, formats, output)]
+        for d in dests:
+            if d in owners:
+                errors[f] = ('would overwrite the track file {}'.format(d)
+                             if owners[d].resolve() == d else
+                             '{} is also exported from {}'.format(
+                                 d, owners[d]))
+                break
+        else:
+            owners.update((d, f) for d in dests)
+    tasks = [(str(f), formats, output, cache) for f in files
+             if f not in errors]
+    results = _run(tasks, jobs or os.cpu_count() or 1)
+    for f in files:
+        yield (str(f), [], errors[f]) if f in errors else next(results)
+    # Shut the pool down
+    results.close()
+    logging.info('{} tracks exported'.format(len(tasks)))
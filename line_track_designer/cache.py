@@ -0,0 +1,146 @@
+"""
+The **cache** module keeps the rendered images of the tracks on disk.
+The files are named after a key computed from the content of the track
+and the render parameters, so an unchanged track is served by copying
+a file instead of being rendered again.
+
+The cache directory is ``$XDG_CACHE_HOME/line-track-designer``
+(``~/.cache/line-track-designer`` by default). When the size of the
+cache exceeds its limit, the least recently used files are removed.
+
+"""
+import os
+import shutil
+import logging
+from pathlib import Path
+from line_track_designer.atomic import atomic_write
+from line_track_designer.error import LineTrackDesignerError
+
+
+def default_directory():
+    """
+    Return the default cache directory.
+
+    Returns:
+        Path: cache directory
+
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return Path(base) / 'line-track-designer'
+
+
+class RenderCache:
+    """
+    Cache of rendered files. A RenderCache object is composed of
+    two fields:
+
+    * **directory** (Path): directory of the cached files
+    * **maxsize** (int): maximum size of the cache in bytes
+
+    """
+    def __init__(self, directory=None, maxsize=256*1024*1024):
+        """
+        Init the cache. The directory is created if needed.
+
+        Args:
+            directory (str): cache directory (default: default_directory())
+            maxsize (int): maximum size in bytes (default: 256 MB)
+
+        Raises:
+            LineTrackDesignerError: invalid maxsize value
+
+        """
+        if maxsize < 0:
+            raise LineTrackDesignerError(
+                    '{} is not a valid maxsize value'.format(maxsize))
+        self._directory = Path(
+            directory if directory is not None else default_directory())
+        self._maxsize = maxsize
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def directory(self):
+        """Get the cache directory."""
+        return self._directory
+
+    @property
+    def maxsize(self):
+        """Get the maximum size of the cache in bytes."""
+        return self._maxsize
+
+    def _path(self, key, suffix):
+        return self.directory / '{}{}'.format(key, suffix)
+
+    def _files(self):
+        return [p for p in self.directory.iterdir()
+                if p.is_file() and not p.name.startswith('.')]
+
+    def get(self, key, file):
+        """
+        Copy the cached file associated to the key to file.
+
+        Args:
+            key (str): key of the file
+            file (str): destination filename
+
+        Returns:
+            bool: True if the file was in the cache
+
+        """
+        path = self._path(key, Path(file).suffix)
+        try:
+            shutil.copyfile(path, file)
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        logging.info('Render cache hit: {}'.format(key))
+        return True
+
+    def put(self, key, file):
+        """
+        Add a copy of file to the cache and remove the least recently
+        used files if the cache is too big.
+
+        Args:
+            key (str): key of the file
+            file (str): filename of the file to cache
+
+        """
+        atomic_write(self._path(key, Path(file).suffix),
+                     lambda tmp: shutil.copyfile(file, tmp))
+        self._evict()
+
+    def _evict(self):
+        files = []
+        for p in self._files():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        total = sum(size for _, size, _ in files)
+        for _, size, p in sorted(files):
+            if total <= self.maxsize:
+                break
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def size(self):
+        """
+        Return the size of the cache in bytes.
+
+        Returns:
+            int: size in bytes
+
+        """
+        return sum(p.stat().st_size for p in self._files())
+
+    def clear(self):
+        """Remove all the files from the cache."""
+        for p in self._files():
+            p.unlink()
+        logging.info('Render cache cleared')
@@ -1,12 +1,21 @@
 """
 Command line interface from Line Track Designer
+
+The modules using NumPy and Pillow are imported by the commands that need
+them, and the text files (.txt) are edited with the **textformat** module,
+so the commands editing a track start quickly.
 """
 import click
 from pathlib import Path
 import logging
-import webbrowser
-from line_track_designer.track import Track
-from line_track_designer.tile import Tile, Tiles
+from line_track_designer import textformat
+from line_track_designer.error import LineTrackDesignerError
+from line_track_designer.batch import FORMATS
+
+
+def _is_text(filename):
+    """Return True if the track can be edited without NumPy."""
+    return Path(filename).suffix == '.txt'
 
 
 @click.group()
@@ -23,8 +32,10 @@ def linetrack(verbosity):
 def show(filename):
     """Show track FILENAME as PNG file.
 
-    FILENAME is a text file following the track file's conventions.
+    FILENAME is a text file following the track file's conventions,
+    or a binary track file (.trk).
     """
+    from line_track_designer.track import Track
     track = Track.read(filename)
     track.show()
 
@@ -33,8 +44,11 @@ def show(filename):
 @click.argument('filename', type=click.Path(exists=True))
 def write(filename):
     """Write track FILENAME in the command prompt."""
-    track = Track.read(filename)
-    click.echo(track)
+    if _is_text(filename):
+        click.echo(textformat.to_string(textformat.read(filename)))
+    else:
+        from line_track_designer.track import Track
+        click.echo(Track.read(filename))
     logging.info('Track writed')
 
 
@@ -48,9 +62,12 @@ def create(filename, nrow, ncol):
     NROW is the number of rows.
     NCOL is the number of columns.
     """
-    track = Track.zeros(nrow, ncol)
-    track.save_txt(filename)
-    click.edit(filename=filename)
+    if _is_text(filename):
+        textformat.write(filename, textformat.zeros(nrow, ncol))
+        click.edit(filename=filename)
+    else:
+        from line_track_designer.track import Track
+        Track.zeros(nrow, ncol).save(filename)
 
 
 @linetrack.command()
@@ -65,18 +82,30 @@ def edit(filename):
 @click.argument('filename', type=click.Path(exists=True))
 def addcol(filename):
     """Add a column to track FILENAME."""
-    track = Track.read(filename)
-    track.add_col()
-    track.save_txt(filename)
+    if _is_text(filename):
+        rows = textformat.read(filename)
+        textformat.add_col(rows)
+        textformat.write(filename, rows)
+    else:
+        from line_track_designer.track import Track
+        track = Track.read(filename)
+        track.add_col()
+        track.save(filename)
 
 
 @linetrack.command()
 @click.argument('filename', type=click.Path(exists=True))
 def addrow(filename):
     """Add a row to track FILENAME."""
-    track = Track.read(filename)
-    track.add_row()
-    track.save_txt(filename)
+    if _is_text(filename):
+        rows = textformat.read(filename)
+        textformat.add_row(rows)
+        textformat.write(filename, rows)
+    else:
+        from line_track_designer.track import Track
+        track = Track.read(filename)
+        track.add_row()
+        track.save(filename)
 
 
 @linetrack.command()
@@ -87,9 +116,15 @@ def delcol(filename, col):
 
     COL is the number of the column to delete.
     """
-    track = Track.read(filename)
-    track.del_col(col)
-    track.save_txt(filename)
+    if _is_text(filename):
+        rows = textformat.read(filename)
+        textformat.del_col(rows, col)
+        textformat.write(filename, rows)
+    else:
+        from line_track_designer.track import Track
+        track = Track.read(filename)
+        track.del_col(col)
+        track.save(filename)
 
 
 @linetrack.command()
@@ -100,9 +135,15 @@ def delrow(filename, row):
 
     ROW is the number of the row to delete.
     """
-    track = Track.read(filename)
-    track.del_row(row)
-    track.save_txt(filename)
+    if _is_text(filename):
+        rows = textformat.read(filename)
+        textformat.del_row(rows, row)
+        textformat.write(filename, rows)
+    else:
+        from line_track_designer.track import Track
+        track = Track.read(filename)
+        track.del_row(row)
+        track.save(filename)
 
 
 @linetrack.command()
@@ -110,9 +151,41 @@ def delrow(filename, row):
 @click.option('-n', default=1, help='Number of rotations')
 def rotate(filename, n):
     """Rotate track FILENAME."""
+    from line_track_designer.track import Track
     track = Track.read(filename)
     track.rotate(n)
-    track.save_txt(filename)
+    track.save(filename)
+
+
+@linetrack.command()
+@click.argument('filename', type=click.Path(exists=True))
+@click.argument('ops', nargs=-1)
+@click.option('-s', '--script', type=click.File('r'), default=None,
+              help='File of operations, one per line (- for stdin)')
+def apply(filename, ops, script):
+    """Apply the operations OPS to track FILENAME.
+
+    Each operation of OPS is a quoted string, for example 'set 0 2 3 1'.
+    Without OPS and script, the operations are read from stdin.
+    The track is read once, and written once if all the operations
+    succeed.
+    """
+    from line_track_designer import script as edit_script
+    from line_track_designer.atomic import atomic_write
+    from line_track_designer.track import Track
+    if script is None and not ops:
+        script = click.open_file('-')
+    lines = list(ops)
+    if script is not None:
+        lines.extend(script.read().splitlines())
+    try:
+        operations = edit_script.parse(lines)
+        track = Track.read(filename)
+        edit_script.apply(track, operations)
+    except LineTrackDesignerError as e:
+        raise click.ClickException(str(e))
+    atomic_write(filename, track.save)
+    logging.info('{} operations applied'.format(len(operations)))
 
 
 @linetrack.command()
@@ -120,17 +193,65 @@ def rotate(filename, n):
 @click.option('-o', '--output', 'filename_png', default='',
               help='Name of the PNG file')
 @click.option('-s', '--show', is_flag=True, help='Show the file created')
-def savepng(filename, filename_png, show):
+@click.option('-f', '--full-resolution', 'full_resolution', is_flag=True,
+              help='Save the tiles at full resolution')
+@click.option('--no-cache', 'no_cache', is_flag=True,
+              help='Do not use the render cache')
+def savepng(filename, filename_png, show, full_resolution, no_cache):
     """Save track FILENAME as PNG file."""
+    from line_track_designer.track import Track
+    from line_track_designer.cache import RenderCache
     track = Track.read(filename)
     p = Path(filename)
     if filename_png == '':
         filename_png = p.with_suffix('.png')
-    track.save_img(filename_png)
+    cache = None if no_cache else RenderCache()
+    if full_resolution:
+        track.save_img(filename_png, None, streaming=True, cache=cache)
+    else:
+        track.save_img(filename_png, cache=cache)
     if show:
         track.show()
 
 
+@linetrack.command()
+@click.argument('filename', type=click.Path(exists=True))
+@click.option('-o', '--output', 'filename_png', default='',
+              help='Name of the PNG file')
+@click.option('-d', '--dpi', default=20, type=click.IntRange(1),
+              help='Resolution of the image in dots per inch')
+@click.option('-i', '--interval', default=0.5, type=click.FloatRange(0.01),
+              help='Time in seconds between two checks')
+@click.option('-s', '--show', is_flag=True, help='Show the file created')
+def watch(filename, filename_png, dpi, interval, show):
+    """Update the PNG file of track FILENAME each time it is saved.
+
+    The process stays open and only the modified cells are rendered
+    again. Press Ctrl+C to stop.
+    """
+    from line_track_designer.watch import Watcher
+    try:
+        watcher = Watcher(filename, filename_png or None, dpi)
+    except LineTrackDesignerError as e:
+        raise click.ClickException(str(e))
+    launched = []
+
+    def report(result):
+        if isinstance(result, LineTrackDesignerError):
+            click.echo('Error: {}'.format(result), err=True)
+            return
+        click.echo('{}: {} cells updated'.format(watcher.output, result))
+        if show and not launched:
+            click.launch(str(watcher.output))
+            launched.append(True)
+
+    click.echo('Watching {} (Ctrl+C to stop)'.format(filename))
+    try:
+        watcher.watch(interval, report)
+    except KeyboardInterrupt:
+        pass
+
+
 @linetrack.command()
 @click.argument('filename', type=click.Path(exists=True))
 @click.option('-o', '--output', 'filename_md', default='',
@@ -139,22 +260,106 @@ def savepng(filename, filename_png, show):
               prompt='Name', help='Name of the track')
 @click.option('-d', '--description', 'description', default='',
               prompt='Description', help='Description of the track')
-def savemd(filename, filename_md, name, description):
+@click.option('--no-cache', 'no_cache', is_flag=True,
+              help='Do not use the render cache')
+def savemd(filename, filename_md, name, description, no_cache):
     """Save track FILENAME as MD file."""
+    from line_track_designer.track import Track
+    from line_track_designer.cache import RenderCache
     track = Track.read(filename, name)
     p = Path(filename)
     if filename_md == '':
         filename_md = p.with_suffix('.md')
-    track.save_md(filename_md, description)
+    track.save_md(filename_md, description,
+                  None if no_cache else RenderCache())
+
+
+@linetrack.command()
+@click.argument('filename', type=click.Path(exists=True))
+@click.option('-o', '--output', 'filename_pdf', default='',
+              help='Name of the PDF file')
+@click.option('--no-cache', 'no_cache', is_flag=True,
+              help='Do not use the render cache')
+def savepdf(filename, filename_pdf, no_cache):
+    """Save the tiles to print track FILENAME as PDF file."""
+    from line_track_designer.track import Track
+    from line_track_designer.cache import RenderCache
+    track = Track.read(filename)
+    if filename_pdf == '':
+        filename_pdf = Path(filename).with_suffix('.pdf')
+    track.export_print_pdf(filename_pdf,
+                           None if no_cache else RenderCache())
+
+
+@linetrack.command()
+@click.argument('paths', nargs=-1, required=True,
+                type=click.Path(exists=True))
+@click.option('-f', '--format', 'formats', multiple=True, default=['png'],
+              type=click.Choice(FORMATS), help='Output format (repeatable)')
+@click.option('-o', '--output', 'output', default=None,
+              type=click.Path(file_okay=False), help='Output directory')
+@click.option('-j', '--jobs', default=None, type=click.IntRange(1),
+              help='Number of processes')
+@click.option('--no-cache', 'no_cache', is_flag=True,
+              help='Do not use the render cache')
+def batch(paths, formats, output, jobs, no_cache):
+    """Export the tracks PATHS.
+
+    PATHS are track files or directories containing track files.
+    """
+    from line_track_designer.batch import batch_export
+    failures = 0
+    for file, created, error in batch_export(
+            paths, formats, output, jobs, not no_cache):
+        if error is None:
+            click.echo('{}: {}'.format(
+                file, ', '.join(str(p) for p in created)))
+        else:
+            failures += 1
+            click.echo('{}: failed: {}'.format(file, error), err=True)
+    if failures:
+        raise click.ClickException('{} tracks failed'.format(failures))
+
+
+@linetrack.command()
+@click.argument('paths', nargs=-1, required=True,
+                type=click.Path(exists=True))
+@click.option('-m', '--mirror', is_flag=True,
+              help='Mirror images are duplicates')
+@click.option('-t', '--threshold', default=None,
+              type=click.FloatRange(0, 1),
+              help='Also show the near-duplicates above this similarity')
+def duplicates(paths, mirror, threshold):
+    """Find the duplicate tracks in PATHS.
+
+    PATHS are track files or directories containing track files.
+    Rotated tracks are duplicates.
+    """
+    from line_track_designer.library import TrackIndex
+    errors = []
+    index = TrackIndex.from_paths(paths, mirror, errors)
+    for file, error in errors:
+        click.echo('{}: failed: {}'.format(file, error), err=True)
+    for keys in index.duplicates():
+        click.echo(' = '.join(keys))
+    if threshold is not None:
+        for key, other, score in index.near_duplicates(threshold):
+            click.echo('{} ~ {} ({:.2f})'.format(key, other, score))
+    if errors:
+        raise click.ClickException('{} tracks failed'.format(len(errors)))
 
 
 @linetrack.command()
 @click.argument('filename', type=click.Path(exists=True))
-def printing(filename):
+@click.option('--no-cache', 'no_cache', is_flag=True,
+              help='Do not use the render cache')
+def printing(filename, no_cache):
     """Print track FILENAME."""
+    from line_track_designer.track import Track
+    from line_track_designer.cache import RenderCache
     if click.confirm('Do you want to print the track?'):
         track = Track.read(filename)
-        track.print_track()
+        track.print_track(cache=None if no_cache else RenderCache())
 
 
 @linetrack.command()
@@ -162,6 +367,7 @@ def printing(filename):
 @click.option('-o', '--orient', default=0, help='Orientation')
 def showtile(number, orient):
     """Show tile NUMBER."""
+    from line_track_designer.tile import Tile
     t = Tile(number)
     t.show(orient)
 
@@ -169,11 +375,13 @@ def showtile(number, orient):
 @linetrack.command()
 def pdf():
     """Open the PDF file containing the tiles."""
+    from line_track_designer.tile import Tiles
     Tiles.show()
 
 
 @linetrack.command()
 def doc():
     """Open the documentation."""
+    import webbrowser
     webbrowser.open('https://line-track-designer.readthedocs.io/en/latest/')
     logging.info('Doc opened')
@@ -0,0 +1,352 @@
+"""
+The **generator** module builds tracks whose line is continuous, using
+constraint propagation (like the *wave function collapse* algorithm).
+
+Each cell has a domain: the set of the (tile, orientation) pairs it can
+still take, stored as a bitset. When a cell is fixed, the domains of its
+neighbours are reduced so that the line stays continuous across the
+seams (AC-3 propagation), and the cell with the smallest domain is fixed
+next.
+
+"""
+import heapq
+import random
+import numpy as np
+from line_track_designer.tile import Tile, CONNECTORS, rotate_connectors
+from line_track_designer.error import LineTrackDesignerError
+
+# Directions to the neighbours: side of the cell, side of the neighbour,
+# offset of the row and offset of the column
+_DIRECTIONS = [(0, 2, -1, 0), (1, 3, 0, 1), (2, 0, 1, 0), (3, 1, 0, -1)]
+BLANK = 11  # tile without line
+
+
+class Generator:
+    """
+    Generate tracks with a continuous line. A Generator object is
+    composed of two fields:
+
+    * **states**: list of the (tile, orientation) pairs that can be used
+    * **weights**: relative probability of each state
+
+    The line of two neighbour cells is continuous if none of them has a
+    line on their common side, or if both of them have one and the
+    positions differ by at most half the line width.
+    """
+    def __init__(self, tiles=None, weights=None):
+        """
+        Init a generator.
+
+        Args:
+            tiles (list of int): tiles that can be used (default: all).
+                The blank tile 11 is always available.
+            weights (dict): relative probability of each tile (default: 1)
+
+        Raises:
+            LineTrackDesignerError: invalid tile
+
+        """
+        numbers = sorted(CONNECTORS) if tiles is None else sorted(
+            set(tiles) | {BLANK})
+        for number in numbers:
+            if not Tile.is_valid(number):
+                raise LineTrackDesignerError(
+                        '{} is not a valid tile value'.format(number))
+        weights = weights or {}
+        self._states = []
+        self._weights = []
+        # Positions of the line on a side (None: no line)
+        positions = sorted(
+            {p for n in numbers for p in CONNECTORS[n] if p is not None}
+            | {Tile.SIDE - p for n in numbers for p in CONNECTORS[n]
+               if p is not None})
+        values = [None] + positions
+        self._values = values
+        # _compat[v]: values compatible with the value v on the other side
+        self._compat = [
+            [w for w, q in enumerate(values)
+             if (p is None) == (q is None) and (
+                 p is None or abs(p - q) <= Tile.LINE_WIDTH / 2)]
+            for p in values]
+        # _masks[s][v]: states with the value v on the side s
+        self._masks = [[0] * len(values) for _ in range(4)]
+        # _lines[k]: number of sides of the state k with a line
+        self._lines = []
+        for number in numbers:
+            for orient in range(4):
+                k = len(self._states)
+                self._states.append((number, orient))
+                self._weights.append(weights.get(number, 1))
+                connectors = rotate_connectors(CONNECTORS[number], orient)
+                self._lines.append(
+                    sum(pos is not None for pos in connectors))
+                for side, pos in enumerate(connectors):
+                    self._masks[side][values.index(pos)] |= 1 << k
+        self._full = (1 << len(self._states)) - 1
+        self._index = {state: k for k, state in enumerate(self._states)}
+
+    @property
+    def states(self):
+        """Get the (tile, orientation) pairs of the generator."""
+        return self._states
+
+    @property
+    def weights(self):
+        """Get the weights of the states."""
+        return self._weights
+
+    def _allowed(self, domain, side, other_side):
+        """Return the states allowed next to the side of a domain."""
+        allowed = 0
+        for value, mask in enumerate(self._masks[side]):
+            if domain & mask:
+                for other in self._compat[value]:
+                    allowed |= self._masks[other_side][other]
+        return allowed
+
+    def _facing(self, side, pos):
+        """
+        Return the states whose line on a side is continuous with a line
+        at the position pos on the other side of the seam (None: no line).
+        """
+        facing = 0
+        for value, q in enumerate(self._values):
+            if (pos is None) == (q is None) and (
+                    pos is None or abs(pos - q) <= Tile.LINE_WIDTH / 2):
+                facing |= self._masks[side][value]
+        return facing
+
+    def domains(self, nrow, ncol, constraints=None, borders=True):
+        """
+        Return the initial domains of the cells, after the propagation of
+        the constraints.
+
+        Args:
+            nrow (int): number of rows
+            ncol (int): number of columns
+            constraints (dict): fixed cells {(row, col): (tile, orient)}
+            borders (bool): forbid the line to leave the track if True
+
+        Returns:
+            list of int: domains of the cells (bitsets), row by row
+
+        Raises:
+            LineTrackDesignerError: the constraints can not be satisfied
+
+        """
+        domains = [self._full] * (nrow * ncol)
+        if borders:
+            for i in range(nrow):
+                for j in range(ncol):
+                    d = domains[i*ncol + j]
+                    for side, _, di, dj in _DIRECTIONS:
+                        if not (0 <= i + di < nrow and 0 <= j + dj < ncol):
+                            d &= self._masks[side][0]
+                    domains[i*ncol + j] = d
+        for (i, j), state in (constraints or {}).items():
+            state = (int(state[0]), int(state[1]) % 4)
+            if state not in self._index or not (
+                    0 <= i < nrow and 0 <= j < ncol):
+                raise LineTrackDesignerError(
+                        'invalid constraint: {} at ({}, {})'.format(
+                            state, i, j))
+            domains[i*ncol + j] &= 1 << self._index[state]
+        self._propagate(domains, nrow, ncol, range(nrow * ncol))
+        return domains
+
+    def _propagate(self, domains, nrow, ncol, cells, heap=None, rng=None,
+                   free=None):
+        """
+        Reduce the domains of the neighbours of the cells until the line
+        can be continuous everywhere (AC-3). If free is given, only the
+        domains of these cells are reduced.
+        """
+        stack = list(cells)
+        while stack:
+            c = stack.pop()
+            i, j = divmod(c, ncol)
+            d = domains[c]
+            if d == 0:
+                raise LineTrackDesignerError(
+                        'no tile can be placed at ({}, {})'.format(i, j))
+            for side, other_side, di, dj in _DIRECTIONS:
+                ni, nj = i + di, j + dj
+                if 0 <= ni < nrow and 0 <= nj < ncol:
+                    n = ni*ncol + nj
+                    if free is not None and n not in free:
+                        continue
+                    nd = domains[n] & self._allowed(d, side, other_side)
+                    if nd != domains[n]:
+                        domains[n] = nd
+                        stack.append(n)
+                        if heap is not None:
+                            heapq.heappush(
+                                heap, (bin(nd).count('1'), rng.random(), n))
+
+    def _choose(self, domain, rng, fewest=False):
+        """
+        Choose a state in a domain with the weights. If fewest is True,
+        only the states with the fewest sides with a line are considered.
+        """
+        states, weights = [], []
+        while domain:
+            low = domain & -domain
+            k = low.bit_length() - 1
+            states.append(k)
+            weights.append(self._weights[k])
+            domain ^= low
+        if fewest:
+            lines = min(self._lines[k] for k in states)
+            weights = [w for k, w in zip(states, weights)
+                       if self._lines[k] == lines]
+            states = [k for k in states if self._lines[k] == lines]
+        if sum(weights) <= 0:
+            return rng.choice(states)
+        return rng.choices(states, weights)[0]
+
+    def _fix(self, domains, nrow, ncol, rng, cells, free=None,
+             fewest=False):
+        """
+        Fix the cells one by one, starting with the smallest domains,
+        and propagate each choice.
+        """
+        heap = [(bin(domains[c]).count('1'), rng.random(), c) for c in cells]
+        heapq.heapify(heap)
+        while heap:
+            count, _, c = heapq.heappop(heap)
+            d = domains[c]
+            if count == 1 or bin(d).count('1') != count:
+                continue
+            domains[c] = 1 << self._choose(d, rng, fewest)
+            self._propagate(domains, nrow, ncol, [c], heap, rng, free)
+
+    def collapse(self, domains, nrow, ncol, rng):
+        """
+        Fix the cells one by one, starting with the smallest domains,
+        and propagate each choice.
+
+        Args:
+            domains (list of int): domains of the cells (modified)
+            nrow (int): number of rows
+            ncol (int): number of columns
+            rng (random.Random): random generator
+
+        Returns:
+            tuple of numpy.array: tiles and orientations
+
+        Raises:
+            LineTrackDesignerError: contradiction
+
+        """
+        self._fix(domains, nrow, ncol, rng, range(len(domains)))
+        tiles = np.empty(nrow * ncol, dtype=np.uint8)
+        orient = np.empty(nrow * ncol, dtype=np.uint8)
+        for c, d in enumerate(domains):
+            tiles[c], orient[c] = self._states[d.bit_length() - 1]
+        return tiles.reshape(nrow, ncol), orient.reshape(nrow, ncol)
+
+    def generate(self, nrow, ncol, seed=None, constraints=None,
+                 borders=True, attempts=10):
+        """
+        Generate the arrays of a track whose line is continuous.
+        The result only depends on the arguments and the seed.
+
+        Args:
+            nrow (int): number of rows
+            ncol (int): number of columns
+            seed (int): seed of the random generator (default: None)
+            constraints (dict): fixed cells {(row, col): (tile, orient)}
+            borders (bool): forbid the line to leave the track if True
+            attempts (int): number of attempts in case of contradiction
+
+        Returns:
+            tuple of numpy.array: tiles and orientations
+
+        Raises:
+            LineTrackDesignerError: unable to generate the track
+
+        """
+        rng = random.Random(seed)
+        domains = self.domains(nrow, ncol, constraints, borders)
+        for _ in range(attempts):
+            try:
+                return self.collapse(list(domains), nrow, ncol, rng)
+            except LineTrackDesignerError:
+                continue
+        raise LineTrackDesignerError('unable to generate the track')
+
+    def fill(self, tiles, orient, seed=None, fewest=False, borders=True,
+             attempts=10):
+        """
+        Choose the tiles of the empty cells (tile 0) so that the line
+        is continuous with the other cells, which are not modified.
+        Only the empty cells and their neighbours are visited, so
+        filling a few holes in a large track is fast.
+
+        Args:
+            tiles (numpy.array): tiles of the track
+            orient (numpy.array): orientations of the tiles
+            seed (int): seed of the random generator (default: None)
+            fewest (bool): use the tiles with the fewest lines if True,
+                so that the empty cells get the blank tile when possible
+            borders (bool): forbid the line to leave the track if True
+            attempts (int): number of attempts in case of contradiction
+
+        Returns:
+            tuple of numpy.array: rows, columns, tiles and orientations
+            of the filled cells
+
+        Raises:
+            LineTrackDesignerError: unable to fill the track
+
+        """
+        nrow, ncol = tiles.shape
+        rows, cols = np.nonzero(tiles == 0)
+        free = set((rows * ncol + cols).tolist())
+        domains = {}
+        for c in free:
+            i, j = divmod(c, ncol)
+            d = self._full
+            for side, other_side, di, dj in _DIRECTIONS:
+                ni, nj = i + di, j + dj
+                if not (0 <= ni < nrow and 0 <= nj < ncol):
+                    if borders:
+                        d &= self._masks[side][0]
+                elif tiles[ni, nj] != 0:
+                    pos = rotate_connectors(
+                        CONNECTORS[int(tiles[ni, nj])],
+                        int(orient[ni, nj]))[other_side]
+                    d &= self._facing(side, pos)
+            domains[c] = d
+        self._propagate(domains, nrow, ncol, free, free=free)
+        rng = random.Random(seed)
+        for _ in range(attempts):
+            result = dict(domains)
+            try:
+                self._fix(result, nrow, ncol, rng, sorted(free), free, fewest)
+            except LineTrackDesignerError:
+                continue
+            cells = sorted(free)
+            states = [self._states[result[c].bit_length() - 1] for c in cells]
+            t = np.array([s[0] for s in states], dtype=np.uint8)
+            o = np.array([s[1] for s in states], dtype=np.uint8)
+            return rows, cols, t, o
+        raise LineTrackDesignerError('unable to fill the track')
+
+
+_default_generator = None
+
+
+def default_generator():
+    """
+    Return the generator using all the tiles with the same weight.
+    It is created once.
+
+    Returns:
+        Generator: default generator
+
+    """
+    global _default_generator
+    if _default_generator is None:
+        _default_generator = Generator()
+    return _default_generator
@@ -0,0 +1,267 @@
+"""
+The **graph** module extracts the network of lines drawn by a track.
+
+The nodes of the graph are the points where the line crosses the border
+between two tiles, and the internal points of the tiles where the line
+forks or stops. The edges are the segments of the line inside the tiles,
+with their lengths in mm.
+
+"""
+import numpy as np
+from line_track_designer.tile import SEGMENTS, rotate_segments
+
+INTERNAL = 4  # maximum number of internal points in a tile
+
+
+def _template(segments):
+    """
+    Encode the segments of a tile as arrays: the sides are 0 to 3 and the
+    internal points 'a', 'b'... are 4, 5...
+    """
+    def code(end):
+        return 4 + ord(end) - ord('a') if isinstance(end, str) else end
+
+    starts = np.array([code(a) for a, _, _ in segments], dtype=int)
+    ends = np.array([code(b) for _, b, _ in segments], dtype=int)
+    lengths = np.array([length for _, _, length in segments], dtype=float)
+    return starts, ends, lengths
+
+
+# Encoded segments of each tile for each orientation
+_TEMPLATES = {
+    (number, orient): _template(rotate_segments(segments, orient))
+    for number, segments in SEGMENTS.items() for orient in range(4)}
+
+
+class PathGraph:
+    """
+    Graph of the line network of a track. It is a multigraph: two points
+    can be linked by several segments. It is composed of four fields:
+
+    * **shape**: number of rows and columns of the track
+    * **starts**: array of the first node of each edge
+    * **ends**: array of the second node of each edge
+    * **lengths**: array of the length of each edge in mm
+
+    The nodes are integers. Use **node_info** to find their location.
+
+    """
+    @staticmethod
+    def from_arrays(tiles, orient):
+        """
+        Build the graph of a track from its arrays. The extraction is
+        linear in the number of cells.
+
+        Args:
+            tiles (numpy.array): array of tiles
+            orient (numpy.array): array of orientations
+
+        Returns:
+            PathGraph: graph of the track
+
+        """
+        nrow, ncol = tiles.shape
+        h = (nrow + 1) * ncol
+        v = nrow * (ncol + 1)
+        codes = tiles.astype(int) * 4 + orient
+        starts, ends, lengths = [], [], []
+        for code in np.unique(codes):
+            number, o = divmod(int(code), 4)
+            if number == 0:
+                continue
+            t_starts, t_ends, t_lengths = _TEMPLATES[(number, o)]
+            if t_lengths.size == 0:
+                continue
+            i, j = np.nonzero(codes == code)
+            # Node of each end (rows) for each cell (columns)
+            nodes = np.empty((4 + INTERNAL, i.size), dtype=int)
+            nodes[0] = i * ncol + j
+            nodes[2] = (i + 1) * ncol + j
+            nodes[3] = h + i * (ncol + 1) + j
+            nodes[1] = nodes[3] + 1
+            nodes[4:] = (h + v + (i * ncol + j) * INTERNAL
+                         + np.arange(INTERNAL)[:, None])
+            starts.append(nodes[t_starts].ravel())
+            ends.append(nodes[t_ends].ravel())
+            lengths.append(np.repeat(t_lengths, i.size))
+        if not starts:
+            empty = np.zeros(0, dtype=int)
+            return PathGraph((nrow, ncol), empty, empty, np.zeros(0))
+        return PathGraph(
+            (nrow, ncol), np.concatenate(starts), np.concatenate(ends),
+            np.concatenate(lengths))
+
+    def __init__(self, shape, starts, ends, lengths):
+        """
+        Init a graph from its edges.
+
+        Args:
+            shape (tuple of int): number of rows and columns of the track
+            starts (numpy.array): first node of each edge
+            ends (numpy.array): second node of each edge
+            lengths (numpy.array): length of each edge in mm
+
+        """
+        self._shape = tuple(shape)
+        self._starts = starts
+        self._ends = ends
+        self._lengths = lengths
+
+    @property
+    def shape(self):
+        """Get the shape of the track."""
+        return self._shape
+
+    @property
+    def starts(self):
+        """Get the first node of each edge."""
+        return self._starts
+
+    @property
+    def ends(self):
+        """Get the second node of each edge."""
+        return self._ends
+
+    @property
+    def lengths(self):
+        """Get the length of each edge in mm."""
+        return self._lengths
+
+    def __len__(self):
+        """Return the number of edges."""
+        return self.lengths.size
+
+    def __str__(self):
+        """
+        Make the string format of the graph.
+        It gives the number of nodes and edges and the total length.
+        """
+        return 'PathGraph: {} nodes, {} edges, {:.1f} mm'.format(
+            self.nodes().size, len(self), self.length())
+
+    def __repr__(self):
+        """
+        Make the repr format of the graph.
+        It's the same than the string format.
+        """
+        return str(self)
+
+    def nodes(self):
+        """
+        Return the nodes of the graph.
+
+        Returns:
+            numpy.array: sorted nodes
+
+        """
+        return np.union1d(self.starts, self.ends)
+
+    def degrees(self):
+        """
+        Return the degree of each node. A loop on a node counts twice.
+
+        Returns:
+            dict: degree of each node
+
+        """
+        nodes, counts = np.unique(
+            np.concatenate([self.starts, self.ends]), return_counts=True)
+        return dict(zip(nodes.tolist(), counts.tolist()))
+
+    def open_ends(self):
+        """
+        Return the nodes where the line stops (degree 1).
+
+        Returns:
+            list of int: nodes
+
+        """
+        return [n for n, d in self.degrees().items() if d == 1]
+
+    def node_info(self, node):
+        """
+        Return the location of a node:
+
+        * ('h', i, j): point on the top border of the cell (i, j)
+        * ('v', i, j): point on the left border of the cell (i, j)
+        * ('c', i, j, k): internal point k of the cell (i, j)
+
+        Args:
+            node (int): node
+
+        Returns:
+            tuple: location of the node
+
+        """
+        node = int(node)
+        nrow, ncol = self.shape
+        h = (nrow + 1) * ncol
+        v = nrow * (ncol + 1)
+        if node < h:
+            return ('h',) + divmod(node, ncol)
+        if node < h + v:
+            return ('v',) + divmod(node - h, ncol + 1)
+        cell, k = divmod(node - h - v, INTERNAL)
+        return ('c',) + divmod(cell, ncol) + (k,)
+
+    def length(self):
+        """
+        Return the total length of the line in mm.
+
+        Returns:
+            float: length in mm
+
+        """
+        return float(self.lengths.sum())
+
+    def components(self):
+        """
+        Return the connected parts of the line network.
+
+        Returns:
+            list of numpy.array: indexes of the edges of each part
+
+        """
+        if self.starts.size == 0:
+            return []
+        # Label each node with the smallest node of its part: the roots
+        # are linked to the smallest root of their edges, then each node
+        # jumps to the root of its parent, until no edge links two roots
+        nodes, edges = np.unique(
+            np.concatenate([self.starts, self.ends]), return_inverse=True)
+        a, b = np.split(edges, 2)
+        parent = np.arange(nodes.size)
+        while True:
+            ra, rb = parent[a], parent[b]
+            linked = ra != rb
+            if not linked.any():
+                break
+            np.minimum.at(parent, np.maximum(ra, rb)[linked],
+                          np.minimum(ra, rb)[linked])
+            while True:
+                jumped = parent[parent]
+                if np.array_equal(jumped, parent):
+                    break
+                parent = jumped
+        # Group the edges by part in one pass, in the order of the parts
+        _, parts = np.unique(parent[a], return_inverse=True)
+        order = np.argsort(parts, kind='stable')
+        return np.split(order, np.cumsum(np.bincount(parts))[:-1])
+
+    def loops(self):
+        """
+        Return the lengths of the closed loops of the network: the
+        connected parts where each node has exactly two segments.
+        For a track made of one closed line, it is the lap length.
+
+        Returns:
+            list of float: lengths of the loops in mm
+
+        """
+        degrees = self.degrees()
+        loops = []
+        for edges in self.components():
+            nodes = np.union1d(self.starts[edges], self.ends[edges])
+            if all(degrees[n] == 2 for n in nodes.tolist()):
+                loops.append(float(self.lengths[edges].sum()))
+        return loops
@@ -0,0 +1,307 @@
+"""
+The **library** module indexes a library of tracks to find the
+duplicates without comparing all the pairs of tracks.
+
+* The exact duplicates (the same design, maybe rotated or mirrored) have
+  the same canonical digest, so they are found with a dictionary.
+* The near-duplicates share most of their 2x2 blocks of tiles. The set
+  of blocks of each track is summarized by a *MinHash* signature, and
+  the signatures are split into bands: two tracks are compared only if
+  they have a band in common (*locality-sensitive hashing*).
+
+"""
+import logging
+from collections import defaultdict
+import numpy as np
+from line_track_designer.track import Track
+from line_track_designer.tile import CANONICAL_ORIENT, MIRROR_TILES
+from line_track_designer.batch import find_tracks
+from line_track_designer.error import LineTrackDesignerError
+
+
+def _variants(track, mirror):
+    """
+    Return the arrays of the rotations of a track (and their mirror
+    images if mirror is True), with normalized orientations.
+    """
+    tracks = [track]
+    if mirror:
+        mirrored = Track(track.tiles, track.orient)
+        try:
+            mirrored.mirror()
+            tracks.append(mirrored)
+        except LineTrackDesignerError:
+            pass
+    for t in tracks:
+        for k in range(4):
+            tiles = np.rot90(t.tiles, k)
+            orient = (np.rot90(t.orient, k) + k) % 4
+            yield tiles, CANONICAL_ORIENT[tiles, orient]
+
+
+def histogram(track, mirror=False):
+    """
+    Return the number of cells of each tile of a track. If mirror is
+    True, the tiles are counted with their mirror image.
+
+    Args:
+        track (Track): track
+        mirror (bool): count the mirror images together
+
+    Returns:
+        numpy.array: number of cells of each tile
+
+    """
+    tiles = track.tiles
+    if mirror:
+        mirrored = MIRROR_TILES[tiles, 0]
+        tiles = np.where(mirrored != 0, np.minimum(tiles, mirrored), tiles)
+    return np.bincount(tiles.ravel(), minlength=34)
+
+
+def blocks(track, mirror=False):
+    """
+    Return the codes of the 2x2 blocks of cells of a track, in all its
+    rotations (and their mirror images if mirror is True). The track is
+    surrounded by empty cells, so the blocks also describe its borders.
+
+    Args:
+        track (Track): track
+        mirror (bool): use the mirror images too
+
+    Returns:
+        numpy.array: sorted unique codes of the blocks
+
+    """
+    codes = []
+    for tiles, orient in _variants(track, mirror):
+        cells = np.pad(tiles.astype(np.uint64) * 4 + orient, 1)
+        codes.append((cells[:-1, :-1] | cells[:-1, 1:] << np.uint64(8)
+                      | cells[1:, :-1] << np.uint64(16)
+                      | cells[1:, 1:] << np.uint64(24)).ravel())
+    return np.unique(np.concatenate(codes))
+
+
+class TrackIndex:
+    """
+    Index of a library of tracks. A TrackIndex object is composed of
+    three fields:
+
+    * **mirror**: True if the mirror images are duplicates
+    * **hashes**: number of hash functions of the signatures
+    * **bands**: number of bands of the signatures
+
+    For example, to find the duplicates of a directory:
+
+    .. code-block:: python
+
+        index = TrackIndex.from_paths(['tracks'], mirror=True)
+        for keys in index.duplicates():
+            print(keys)
+
+    """
+    def __init__(self, mirror=False, hashes=64, bands=16, seed=0):
+        """
+        Init an empty index.
+
+        Args:
+            mirror (bool): True if the mirror images are duplicates
+            hashes (int): number of hash functions of the signatures
+            bands (int): number of bands (must divide hashes)
+            seed (int): seed of the hash functions
+
+        Raises:
+            LineTrackDesignerError: bands does not divide hashes
+
+        """
+        if hashes % bands != 0:
+            raise LineTrackDesignerError('bands must divide hashes')
+        self._mirror = mirror
+        self._hashes = hashes
+        self._bands = bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 2**63, hashes, dtype=np.uint64) * \
+            np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2**63, hashes, dtype=np.uint64)
+        self._entries = {}
+        self._digests = defaultdict(list)
+        self._buckets = defaultdict(list)
+
+    @staticmethod
+    def from_paths(paths, mirror=False, errors=None, **kwargs):
+        """
+        Make the index of the track files given by a list of files and
+        directories. The keys are the filenames. A file that can not be
+        read is skipped, and the other files are still indexed.
+
+        Args:
+            paths (list of str): files and directories
+            mirror (bool): True if the mirror images are duplicates
+            errors (list): if given, the files skipped and their error
+                messages are appended to it
+
+        Returns:
+            TrackIndex: index of the tracks
+
+        """
+        index = TrackIndex(mirror, **kwargs)
+        for file in find_tracks(paths):
+            try:
+                track = Track.read(file)
+            except (LineTrackDesignerError, OSError, ValueError) as e:
+                logging.info('{} skipped: {}'.format(file, e))
+                if errors is not None:
+                    errors.append((str(file), str(e)))
+                continue
+            index.add(track, str(file))
+        logging.info('{} tracks indexed'.format(len(index)))
+        return index
+
+    @property
+    def mirror(self):
+        """Return True if the mirror images are duplicates."""
+        return self._mirror
+
+    @property
+    def hashes(self):
+        """Get the number of hash functions of the signatures."""
+        return self._hashes
+
+    @property
+    def bands(self):
+        """Get the number of bands of the signatures."""
+        return self._bands
+
+    def __len__(self):
+        """Return the number of tracks of the index."""
+        return len(self._entries)
+
+    def __contains__(self, key):
+        """Return True if a track is indexed with the key."""
+        return key in self._entries
+
+    def signature(self, track):
+        """
+        Return the MinHash signature of the blocks of a track.
+
+        Args:
+            track (Track): track
+
+        Returns:
+            numpy.array: signature
+
+        """
+        codes = blocks(track, self._mirror)
+        h = codes[:, np.newaxis] * self._a + self._b
+        return (h >> np.uint64(32)).min(axis=0)
+
+    def _sketch(self, track):
+        """Return the canonical digest, histogram and signature."""
+        return (track.canonical_digest(self._mirror),
+                histogram(track, self._mirror), self.signature(track))
+
+    def _bands_of(self, signature):
+        """Return the keys of the buckets of a signature."""
+        rows = self._hashes // self._bands
+        return [(b, signature[b*rows:(b+1)*rows].tobytes())
+                for b in range(self._bands)]
+
+    def add(self, track, key):
+        """
+        Add a track to the index.
+
+        Args:
+            track (Track): track
+            key (str): key of the track (for example its filename)
+
+        Raises:
+            LineTrackDesignerError: the key is already used
+
+        """
+        if key in self._entries:
+            raise LineTrackDesignerError('{} is already indexed'.format(key))
+        digest, hist, signature = self._sketch(track)
+        self._entries[key] = (digest, hist, signature)
+        self._digests[digest].append(key)
+        for bucket in self._bands_of(signature):
+            self._buckets[bucket].append(key)
+
+    def find(self, track):
+        """
+        Return the keys of the exact duplicates of a track.
+
+        Args:
+            track (Track): track
+
+        Returns:
+            list of str: keys of the duplicates
+
+        """
+        return list(self._digests.get(track.canonical_digest(self._mirror),
+                                      []))
+
+    def duplicates(self):
+        """
+        Return the groups of exact duplicates of the index.
+
+        Returns:
+            list of list of str: keys of the tracks of each group
+
+        """
+        return [list(keys) for keys in self._digests.values()
+                if len(keys) > 1]
+
+    def _similar(self, hist, signature, threshold):
+        """Return the similar tracks of a sketch with their score."""
+        candidates = set()
+        for bucket in self._bands_of(signature):
+            candidates.update(self._buckets.get(bucket, []))
+        results = []
+        for key in candidates:
+            _, other_hist, other_signature = self._entries[key]
+            overlap = np.minimum(hist, other_hist).sum() / max(
+                hist.sum(), other_hist.sum(), 1)
+            if overlap < threshold:
+                continue
+            score = float(np.mean(signature == other_signature))
+            if score >= threshold:
+                results.append((key, score))
+        return sorted(results, key=lambda r: (-r[1], r[0]))
+
+    def similar(self, track, threshold=0.5):
+        """
+        Return the near-duplicates of a track: the tracks having a
+        similar histogram of tiles and a similar set of 2x2 blocks.
+        Only the tracks sharing a band of signature are compared.
+
+        Args:
+            track (Track): track
+            threshold (float): minimum similarity, between 0 and 1
+
+        Returns:
+            list of tuple: keys and estimated similarities of the tracks,
+            the most similar first
+
+        """
+        _, hist, signature = self._sketch(track)
+        return self._similar(hist, signature, threshold)
+
+    def near_duplicates(self, threshold=0.5):
+        """
+        Return the pairs of near-duplicates of the index. The exact
+        duplicates are not included.
+
+        Args:
+            threshold (float): minimum similarity, between 0 and 1
+
+        Returns:
+            list of tuple: keys of the tracks and estimated similarity,
+            the most similar first
+
+        """
+        pairs = []
+        for key, (digest, hist, signature) in self._entries.items():
+            for other, score in self._similar(hist, signature, threshold):
+                if key < other and self._entries[other][0] != digest:
+                    pairs.append((key, other, score))
+        return sorted(pairs, key=lambda p: (-p[2], p[0], p[1]))
@@ -0,0 +1,452 @@
+"""
+The **pdfwriter** module builds PDF files made of pages of another PDF
+file, for example the pages of the tiles to print a track.
+
+The pages are copied by reference: the contents, fonts and images of a
+page are copied once, byte for byte, without being decoded, and all the
+copies of the page share them. Only the objects used by the pages are
+written, so the file stays small.
+
+The reader supports the cross-reference tables and streams and the
+object streams of PDF 1.5, which is enough for the PDF file of the tiles.
+
+"""
+import re
+import zlib
+from collections import namedtuple
+from line_track_designer.error import LineTrackDesignerError
+
+Ref = namedtuple('Ref', ['num', 'gen'])
+
+
+class Name(str):
+    """Name of a PDF file (/Type, /Page...), without the slash."""
+
+
+class Raw(bytes):
+    """Value of a PDF file written as it was read (string, number...)."""
+
+
+class Stream:
+    """Stream of a PDF file: dictionary and raw (encoded) data."""
+    def __init__(self, dictionary, data):
+        self.dictionary = dictionary
+        self.data = data
+
+
+_WHITESPACE = b' \t\r\n\f\x00'
+_TOKEN_RE = re.compile(rb'[^ \t\r\n\f\x00()<>\[\]{}/%]+')
+_REF_RE = re.compile(rb'(\d+)\s+(\d+)\s+R')
+_OBJ_RE = re.compile(rb'\s*(\d+)\s+(\d+)\s+obj')
+_SUBSECTION_RE = re.compile(rb'(\d+)\s+(\d+)')
+# Keys of a page that are not copied: its parent in the page tree and
+# its links to the structure tree and the annotations of the source file
+_PAGE_SKIPPED = {'Parent', 'StructParents', 'Annots', 'Tabs'}
+# Attributes that a page inherits from the nodes of the page tree
+_PAGE_INHERITED = ('Resources', 'MediaBox', 'CropBox', 'Rotate')
+
+
+class _Parser:
+    """Parse the objects of a PDF file."""
+    def __init__(self, data):
+        self.data = data
+
+    def skip(self, pos):
+        """Skip the whitespaces and the comments."""
+        data = self.data
+        while pos < len(data):
+            c = data[pos]
+            if c in _WHITESPACE:
+                pos += 1
+            elif c == ord('%'):
+                while pos < len(data) and data[pos] not in b'\r\n':
+                    pos += 1
+            else:
+                break
+        return pos
+
+    def parse(self, pos):
+        """Parse the value at pos and return it with the next position."""
+        data = self.data
+        pos = self.skip(pos)
+        if data.startswith(b'<<', pos):
+            d = {}
+            pos = self.skip(pos + 2)
+            while not data.startswith(b'>>', pos):
+                key, pos = self.parse(pos)
+                value, pos = self.parse(pos)
+                d[key] = value
+                pos = self.skip(pos)
+            return d, pos + 2
+        c = data[pos:pos+1]
+        if c == b'[':
+            a = []
+            pos = self.skip(pos + 1)
+            while data[pos:pos+1] != b']':
+                value, pos = self.parse(pos)
+                a.append(value)
+                pos = self.skip(pos)
+            return a, pos + 1
+        if c == b'/':
+            m = _TOKEN_RE.match(data, pos + 1)
+            end = m.end() if m else pos + 1
+            return Name(data[pos+1:end].decode('latin-1')), end
+        if c == b'(':
+            depth, end = 0, pos
+            while True:
+                ch = data[end]
+                if ch == ord('\\'):
+                    end += 2
+                    continue
+                if ch == ord('('):
+                    depth += 1
+                elif ch == ord(')'):
+                    depth -= 1
+                    if depth == 0:
+                        return Raw(data[pos:end+1]), end + 1
+                end += 1
+        if c == b'<':
+            end = data.index(b'>', pos)
+            return Raw(data[pos:end+1]), end + 1
+        m = _REF_RE.match(data, pos)
+        if m:
+            return Ref(int(m.group(1)), int(m.group(2))), m.end()
+        m = _TOKEN_RE.match(data, pos)
+        if not m:
+            raise LineTrackDesignerError(
+                    'invalid PDF file: unexpected data at {}'.format(pos))
+        return Raw(m.group()), m.end()
+
+
+class PDFReader:
+    """
+    Read the objects of a PDF file. A PDFReader object is composed of
+    two fields:
+
+    * **filename** (str)
+    * **pages** (list of Ref): references of the pages
+
+    """
+    def __init__(self, filename):
+        """
+        Read a PDF file and its cross-reference sections.
+
+        Args:
+            filename (str): filename (PDF file)
+
+        Raises:
+            LineTrackDesignerError: invalid PDF file
+
+        """
+        self._filename = filename
+        with open(filename, 'rb') as f:
+            self._data = f.read()
+        self._parser = _Parser(self._data)
+        self._offsets = {}
+        self._compressed = {}
+        self._objects = {}
+        self._trailer = {}
+        start = self._data.rfind(b'startxref')
+        if start < 0:
+            raise LineTrackDesignerError('invalid PDF file: no startxref')
+        pos = int(self._data[start+9:].split()[0])
+        seen = set()
+        while pos is not None and pos not in seen:
+            seen.add(pos)
+            trailer = self._read_xref(pos)
+            for key, value in trailer.items():
+                self._trailer.setdefault(key, value)
+            if 'XRefStm' in trailer:
+                self._read_xref(int(trailer['XRefStm']))
+            pos = int(trailer['Prev']) if 'Prev' in trailer else None
+        self._pages = []
+        self._inherited = {}
+        self._walk(self.get(self._trailer['Root'])['Pages'], {})
+
+    @property
+    def filename(self):
+        """Get the filename."""
+        return self._filename
+
+    @property
+    def pages(self):
+        """Get the references of the pages."""
+        return self._pages
+
+    def _read_xref(self, pos):
+        """Read a cross-reference section and return its trailer."""
+        data = self._data
+        pos = self._parser.skip(pos)
+        if not data.startswith(b'xref', pos):
+            return self._read_xref_stream(pos)
+        pos += 4
+        while True:
+            pos = self._parser.skip(pos)
+            if data.startswith(b'trailer', pos):
+                return self._parser.parse(pos + 7)[0]
+            m = _SUBSECTION_RE.match(data, pos)
+            first, count = int(m.group(1)), int(m.group(2))
+            pos = self._parser.skip(m.end())
+            for k in range(count):
+                entry = data[pos:pos+20].split()
+                if entry[2] == b'n':
+                    self._offsets.setdefault(first + k, int(entry[0]))
+                pos += 20
+
+    def _read_xref_stream(self, pos):
+        """Read a cross-reference stream and return its dictionary."""
+        _, stream = self._read_object(pos)
+        d = stream.dictionary
+        data = self._decode(stream)
+        widths = [int(w) for w in d['W']]
+        index = [int(i) for i in d.get('Index', [0, int(d['Size'])])]
+        size = sum(widths)
+        k = 0
+        for first, count in zip(index[::2], index[1::2]):
+            for num in range(first, first + count):
+                fields = [int.from_bytes(
+                    data[k+sum(widths[:i]):k+sum(widths[:i+1])], 'big')
+                    for i in range(3)]
+                if widths[0] == 0:
+                    fields[0] = 1
+                k += size
+                if fields[0] == 1:
+                    self._offsets.setdefault(num, fields[1])
+                elif fields[0] == 2:
+                    self._compressed.setdefault(num, (fields[1], fields[2]))
+        return d
+
+    def _read_object(self, pos):
+        """Read the indirect object at pos and return its number."""
+        m = _OBJ_RE.match(self._data, pos)
+        if not m:
+            raise LineTrackDesignerError(
+                    'invalid PDF file: no object at {}'.format(pos))
+        value, pos = self._parser.parse(m.end())
+        pos = self._parser.skip(pos)
+        if isinstance(value, dict) and self._data.startswith(b'stream', pos):
+            pos += 6
+            if self._data.startswith(b'\r\n', pos):
+                pos += 2
+            elif self._data[pos:pos+1] == b'\n':
+                pos += 1
+            length = value['Length']
+            if isinstance(length, Ref):
+                length = self.get(length)
+            value = Stream(value, self._data[pos:pos+int(length)])
+        return int(m.group(1)), value
+
+    def _decode(self, stream):
+        """Return the decoded data of a stream (FlateDecode only)."""
+        filters = stream.dictionary.get('Filter', [])
+        if not isinstance(filters, list):
+            filters = [filters]
+        data = stream.data
+        for f in filters:
+            if f != 'FlateDecode':
+                raise LineTrackDesignerError(
+                        'unsupported PDF filter: {}'.format(f))
+            data = zlib.decompress(data)
+        params = stream.dictionary.get('DecodeParms') or {}
+        predictor = int(params.get('Predictor', 1))
+        if predictor >= 10:
+            columns = int(params.get('Columns', 1))
+            rows, prev = [], bytearray(columns)
+            for k in range(0, len(data), columns + 1):
+                row = bytearray(data[k+1:k+1+columns])
+                if data[k] == 2:
+                    for i in range(columns):
+                        row[i] = (row[i] + prev[i]) & 0xff
+                elif data[k] != 0:
+                    raise LineTrackDesignerError(
+                            'unsupported PDF predictor')
+                rows.append(bytes(row))
+                prev = row
+            data = b''.join(rows)
+        return data
+
+    def get(self, ref):
+        """
+        Return the value of an indirect object.
+
+        Args:
+            ref (Ref): reference of the object
+
+        Returns:
+            value of the object (dict, list, Name, Raw or Stream)
+
+        Raises:
+            LineTrackDesignerError: object not found
+
+        """
+        num = ref.num if isinstance(ref, Ref) else ref
+        if num in self._objects:
+            return self._objects[num]
+        if num in self._offsets:
+            value = self._read_object(self._offsets[num])[1]
+        elif num in self._compressed:
+            value = self._read_compressed(*self._compressed[num])
+        else:
+            raise LineTrackDesignerError(
+                    'invalid PDF file: object {} not found'.format(num))
+        self._objects[num] = value
+        return value
+
+    def _read_compressed(self, stream_num, index):
+        """Read an object stored in an object stream."""
+        stream = self.get(stream_num)
+        data = self._decode(stream)
+        first = int(stream.dictionary['First'])
+        header = data[:first].split()
+        offset = int(header[2*index + 1])
+        return _Parser(data).parse(first + offset)[0]
+
+    def _walk(self, ref, inherited):
+        """Add the pages of a node of the page tree."""
+        node = self.get(ref)
+        inherited = dict(inherited)
+        for key in _PAGE_INHERITED:
+            if key in node:
+                inherited[key] = node[key]
+        if node.get('Type') == 'Pages':
+            for kid in node['Kids']:
+                self._walk(kid, inherited)
+        else:
+            self._pages.append(ref)
+            self._inherited[ref] = inherited
+
+    def page(self, index):
+        """
+        Return the dictionary of a page with its inherited attributes.
+
+        Args:
+            index (int): index of the page (starting at 0)
+
+        Returns:
+            dict: dictionary of the page
+
+        """
+        ref = self._pages[index]
+        page = dict(self._inherited[ref])
+        page.update(self.get(ref))
+        return page
+
+
+class PDFWriter:
+    """
+    Write a PDF file made of pages of other PDF files. A PDFWriter object
+    is composed of one field:
+
+    * **filename** (str)
+
+    A PDF file can be written using the *with* statement.
+
+    """
+    def __init__(self, filename):
+        """
+        Init a PDF file.
+
+        Args:
+            filename (str): filename (PDF file)
+
+        """
+        self._filename = filename
+        self._objects = [None, None]  # catalog and page tree
+        self._copied = {}
+        self._kids = []
+
+    @property
+    def filename(self):
+        """Get the filename."""
+        return self._filename
+
+    def _add(self, value):
+        """Add an object and return its reference."""
+        self._objects.append(value)
+        return Ref(len(self._objects), 0)
+
+    def _copy(self, reader, value):
+        """Copy a value and the objects it refers to."""
+        if isinstance(value, Ref):
+            key = (id(reader), value.num)
+            if key not in self._copied:
+                self._copied[key] = ref = self._add(None)
+                self._objects[ref.num - 1] = self._copy(
+                    reader, reader.get(value))
+            return self._copied[key]
+        if isinstance(value, dict):
+            return {k: self._copy(reader, v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._copy(reader, v) for v in value]
+        if isinstance(value, Stream):
+            return Stream(self._copy(reader, value.dictionary), value.data)
+        return value
+
+    def add_page(self, reader, index):
+        """
+        Add a copy of a page of a PDF file. The objects of the page are
+        copied the first time, and shared by all the copies.
+
+        Args:
+            reader (PDFReader): PDF file
+            index (int): index of the page (starting at 0)
+
+        """
+        page = {k: v for k, v in reader.page(index).items()
+                if k not in _PAGE_SKIPPED}
+        key = (id(reader), 'page', index)
+        if key not in self._copied:
+            self._copied[key] = self._copy(reader, page)
+        page = dict(self._copied[key])
+        page['Parent'] = Ref(2, 0)
+        self._kids.append(self._add(page))
+
+    def _serialize(self, value):
+        if isinstance(value, Ref):
+            return '{} {} R'.format(value.num, value.gen).encode()
+        if isinstance(value, Name):
+            return b'/' + value.encode('latin-1')
+        if isinstance(value, dict):
+            return b'<<' + b''.join(
+                self._serialize(Name(k)) + b' ' + self._serialize(v) + b' '
+                for k, v in value.items()) + b'>>'
+        if isinstance(value, list):
+            return b'[' + b' '.join(self._serialize(v) for v in value) + b']'
+        if isinstance(value, bytes):
+            return bytes(value)
+        return str(value).encode()
+
+    def close(self):
+        """Write the file."""
+        self._objects[0] = {'Type': Name('Catalog'), 'Pages': Ref(2, 0)}
+        self._objects[1] = {'Type': Name('Pages'), 'Kids': self._kids,
+                            'Count': len(self._kids)}
+        offsets = []
+        with open(self._filename, 'wb') as f:
+            f.write(b'%PDF-1.5\n%\xe2\xe3\xcf\xd3\n')
+            for num, value in enumerate(self._objects, 1):
+                offsets.append(f.tell())
+                f.write('{} 0 obj\n'.format(num).encode())
+                if isinstance(value, Stream):
+                    d = dict(value.dictionary)
+                    d['Length'] = len(value.data)
+                    f.write(self._serialize(d) + b'\nstream\n')
+                    f.write(value.data + b'\nendstream')
+                else:
+                    f.write(self._serialize(value))
+                f.write(b'\nendobj\n')
+            xref = f.tell()
+            f.write('xref\n0 {}\n0000000000 65535 f \n'.format(
+                len(self._objects) + 1).encode())
+            for offset in offsets:
+                f.write('{:010d} 00000 n \n'.format(offset).encode())
+            f.write(b'trailer\n' + self._serialize(
+                {'Size': len(self._objects) + 1, 'Root': Ref(1, 0)}))
+            f.write('\nstartxref\n{}\n%%EOF\n'.format(xref).encode())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
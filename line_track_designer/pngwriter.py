@@ -0,0 +1,156 @@
+"""
+The **pngwriter** module writes PNG files band by band.
+Unlike PIL, which needs the whole image in memory to save it,
+the **PNGWriter** class compresses and writes the rows of the image as
+soon as they are given, so very large images can be exported with a
+bounded memory.
+
+A PNG file can be written using the *with* statement.
+
+"""
+import struct
+import zlib
+from line_track_designer.error import LineTrackDesignerError
+
+
+class PNGWriter:
+    """
+    Write a PNG file band by band. A PNGWriter object is composed of
+    four fields:
+
+    * **filename** (str)
+    * **width** (int): width of the image in pixels
+    * **height** (int): height of the image in pixels
+    * **mode** (str): mode of the image ('L' or 'RGB')
+
+    """
+    COLOR_TYPES = {'L': (0, 1), 'RGB': (2, 3)}
+    IDAT_SIZE = 1 << 16  # minimum size of an IDAT chunk in bytes
+
+    def __init__(self, filename, width, height, mode='RGB', dpi=None):
+        """
+        Init a PNG file. It creates the file and writes the header.
+
+        Args:
+            filename (str): filename (PNG file)
+            width (int): width of the image in pixels
+            height (int): height of the image in pixels
+            mode (str): mode of the image: 'L' or 'RGB' (default: 'RGB')
+            dpi (int): resolution in dots per inch (default: None)
+
+        Raises:
+            LineTrackDesignerError: invalid mode
+            LineTrackDesignerError: invalid dimensions
+
+        """
+        if mode not in PNGWriter.COLOR_TYPES:
+            raise LineTrackDesignerError('invalid mode: {}'.format(mode))
+        if width <= 0 or height <= 0:
+            raise LineTrackDesignerError(
+                    'invalid dimensions: {}x{}'.format(width, height))
+        self._filename = filename
+        self._width = width
+        self._height = height
+        self._mode = mode
+        self._rows = 0
+        self._buffer = []
+        self._buffer_size = 0
+        self._compressor = zlib.compressobj()
+        self._f = open(filename, 'wb')
+        color_type, _ = PNGWriter.COLOR_TYPES[mode]
+        self._f.write(b'\x89PNG\r\n\x1a\n')
+        self._write_chunk(b'IHDR', struct.pack(
+            '>IIBBBBB', width, height, 8, color_type, 0, 0, 0))
+        if dpi is not None:
+            ppm = round(dpi / 0.0254)
+            self._write_chunk(b'pHYs', struct.pack('>IIB', ppm, ppm, 1))
+
+    @property
+    def filename(self):
+        """Get the filename."""
+        return self._filename
+
+    @property
+    def width(self):
+        """Get the width of the image."""
+        return self._width
+
+    @property
+    def height(self):
+        """Get the height of the image."""
+        return self._height
+
+    @property
+    def mode(self):
+        """Get the mode of the image."""
+        return self._mode
+
+    def __enter__(self):
+        """Enter in a with statement."""
+        return self
+
+    def _write_chunk(self, chunk_type, data):
+        self._f.write(struct.pack('>I', len(data)))
+        self._f.write(chunk_type)
+        self._f.write(data)
+        self._f.write(struct.pack(
+            '>I', zlib.crc32(data, zlib.crc32(chunk_type)) & 0xffffffff))
+
+    def _write_data(self, data, flush=False):
+        if data:
+            self._buffer.append(data)
+            self._buffer_size += len(data)
+        if self._buffer and (flush or self._buffer_size >= self.IDAT_SIZE):
+            self._write_chunk(b'IDAT', b''.join(self._buffer))
+            self._buffer = []
+            self._buffer_size = 0
+
+    def write(self, image):
+        """
+        Write a band of rows at the end of the image.
+
+        Args:
+            image (Image): band to write; it must have the width and the
+                mode of the PNG file
+
+        Raises:
+            LineTrackDesignerError: invalid band
+
+        """
+        w, h = image.size
+        if w != self.width or image.mode != self.mode:
+            raise LineTrackDesignerError('invalid band')
+        if self._rows + h > self.height:
+            raise LineTrackDesignerError('too many rows')
+        _, channels = PNGWriter.COLOR_TYPES[self.mode]
+        stride = w * channels
+        raw = memoryview(image.tobytes())
+        # Each row starts with the filter type (0: no filter)
+        data = b''.join(
+            b'\x00' + raw[k*stride:(k+1)*stride] for k in range(h))
+        self._write_data(self._compressor.compress(data))
+        self._rows += h
+
+    def close(self):
+        """
+        Write the end of the image and close the file.
+
+        Raises:
+            LineTrackDesignerError: missing rows
+
+        """
+        try:
+            if self._rows != self.height:
+                raise LineTrackDesignerError(
+                        'missing rows: {}/{}'.format(self._rows, self.height))
+            self._write_data(self._compressor.flush(), True)
+            self._write_chunk(b'IEND', b'')
+        finally:
+            self._f.close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit and close the file."""
+        if exc_type is None:
+            self.close()
+        else:
+            self._f.close()
@@ -2,18 +2,133 @@
 With the **printer** module, you can print the tracks built with the
 library. It uses *CUPS*.
 
+The connection to the *CUPS* server is opened once and shared by all
+the printings of the process. The pages to print are gathered in a
+print plan, so a track is printed with as few jobs as possible.
+
 Warnings:
     This module can be used only on Linux and macOS.
 
 """
 import os
 import logging
+import threading
 try:
     import cups
 except ImportError:
-    pass
+    cups = None
 from line_track_designer.error import LineTrackDesignerError
 
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def connection():
+    """
+    Return the connection to the *CUPS* server shared by the process.
+    It is opened the first time.
+
+    Returns:
+        cups.Connection: connection
+
+    Raises:
+        LineTrackDesignerError: CUPS is not available
+
+    """
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            if cups is None:
+                raise LineTrackDesignerError('CUPS is not available')
+            _connection = cups.Connection()
+            logging.info('Connected to CUPS')
+        return _connection
+
+
+def page_ranges(pages):
+    """
+    Merge pages into a list of ranges for the option page-ranges.
+    For example, the pages [2, 3, 4, 8] give '2-4,8'.
+
+    Args:
+        pages (list of int): pages
+
+    Returns:
+        str: ranges of pages
+
+    """
+    ranges = []
+    for page in sorted(set(pages)):
+        if ranges and ranges[-1][1] == page - 1:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+    return ','.join(
+        str(a) if a == b else '{}-{}'.format(a, b) for a, b in ranges)
+
+
+class PrintPlan:
+    """
+    Pages of the PDF file of the tiles to print, with their number of
+    copies. A PrintPlan object is composed of two fields:
+
+    * **copies**: number of copies of each page
+    * **title**: name of the printing
+
+    The pages with the same number of copies are printed by the same job.
+
+    """
+    def __init__(self, copies, title='track'):
+        """
+        Init a print plan.
+
+        Args:
+            copies (dict): number of copies of each page
+            title (str): name of the printing
+
+        """
+        self._copies = {int(p): int(n) for p, n in copies.items() if n > 0}
+        self._title = title
+
+    @staticmethod
+    def from_track(track):
+        """
+        Make the print plan of a track: the page i of the PDF file is the
+        tile i, printed once for each cell using it.
+
+        Args:
+            track (Track): track to print
+
+        Returns:
+            PrintPlan: print plan
+
+        """
+        return PrintPlan(track.occurences(), track.name)
+
+    @property
+    def copies(self):
+        """Get the number of copies of each page."""
+        return self._copies
+
+    @property
+    def title(self):
+        """Get the name of the printing."""
+        return self._title
+
+    def jobs(self):
+        """
+        Return the jobs to print the plan: the ranges of pages and the
+        number of copies of each job, with the fewest copies first.
+
+        Returns:
+            list of tuple: ranges of pages and number of copies
+
+        """
+        groups = {}
+        for page, n in self._copies.items():
+            groups.setdefault(n, []).append(page)
+        return [(page_ranges(groups[n]), n) for n in sorted(groups)]
+
 
 class Printer:
     """
@@ -23,6 +138,10 @@ class Printer:
     * **printer_name**: the name of the default printer
     * **file_tiles**: the path to the PDF document with the tiles to print
 
+    Any object with the methods *getPrinters* and *printFile* of
+    *cups.Connection* can be used as connection, for example to test
+    the printings without a printer.
+
     Raises:
         LineTrackDesignerError: no printers found
 
@@ -30,21 +149,30 @@ class Printer:
         If no printer is found, you need to add one in your devices.
 
     """
-    def __init__(self):
-        """Init a Printer object."""
-        try:
-            self._conn = cups.Connection()
+    def __init__(self, conn=None, printer_name=None):
+        """
+        Init a Printer object.
+
+        Args:
+            conn: connection to the *CUPS* server (default: shared
+                connection of the process)
+            printer_name (str): name of the printer (default: first
+                printer of the server)
+
+        Raises:
+            LineTrackDesignerError: no printers found
+
+        """
+        self._conn = connection() if conn is None else conn
+        if printer_name is None:
             printers = self._conn.getPrinters()
-            if printers:
-                self._printer_name = list(printers.keys())[0]
-                cwd = os.path.dirname(os.path.abspath(__file__))
-                self._file_tiles = os.path.join(
-                    cwd, 'pdf', 'linefollowtiles.pdf')
-            else:
+            if not printers:
                 raise LineTrackDesignerError('no printers found')
-            logging.info('Printer {} found'.format(self.printer_name))
-        except ImportError:
-            pass
+            printer_name = list(printers.keys())[0]
+        self._printer_name = printer_name
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        self._file_tiles = os.path.join(cwd, 'pdf', 'linefollowtiles.pdf')
+        logging.info('Printer {} found'.format(self.printer_name))
 
     @property
     def conn(self):
@@ -75,30 +203,85 @@ class Printer:
         """
         return str(self)
 
+    def _print_file(self, file, title, options):
+        """Submit a job to the printer and return its id."""
+        try:
+            return self.conn.printFile(
+                self.printer_name, str(file), title, options)
+        except Exception:
+            raise LineTrackDesignerError('printing failed')
+
     def print_page(self, copies, pages, title, media='a4'):
         """
         Ask to the printer to print pages of the PDF file.
 
         Args:
             copies (int): number of copies to print
-            pages (int): pages to print
+            pages (int or str): pages to print (for example: '2-4,8')
             title (str): name of the printing
             media (str): format (default: 'a4')
 
+        Returns:
+            int: id of the job
+
         Raises:
             LineTrackDesignerError: printing failed
 
         """
-        try:
-            self.conn.printFile(
-                self.printer_name,
-                self.file_tiles,
-                title,
-                {
-                    'copies': str(copies),
-                    'page-ranges': str(pages),
-                    'media': media,
-                    'sides': 'one-sided'})
-        except Exception:
-            raise LineTrackDesignerError('printing failed')
+        job = self._print_file(self.file_tiles, title, {
+            'copies': str(copies),
+            'page-ranges': str(pages),
+            'media': media,
+            'sides': 'one-sided'})
         logging.info('Pages {} printed'.format(pages))
+        return job
+
+    def print_plan(self, plan, media='a4', file=None):
+        """
+        Ask to the printer to print a plan. The pages with the same
+        number of copies are printed by the same job. If file is given,
+        it must be a PDF file containing all the pages of the plan with
+        their copies (pre-imposed), and it is printed by a single job.
+
+        Args:
+            plan (PrintPlan): plan to print
+            media (str): format (default: 'a4')
+            file (str): pre-imposed PDF file (default: None)
+
+        Returns:
+            list of int: ids of the jobs
+
+        Raises:
+            LineTrackDesignerError: printing failed
+
+        """
+        if file is not None:
+            jobs = [self._print_file(file, plan.title, {
+                'media': media, 'sides': 'one-sided'})]
+            logging.info('File {} printed'.format(file))
+        else:
+            jobs = [self.print_page(copies, pages, plan.title, media)
+                    for pages, copies in plan.jobs()]
+        return jobs
+
+
+_default_printer = None
+
+
+def default_printer():
+    """
+    Return the printer using the shared connection and the first
+    printer of the server. It is created once.
+
+    Returns:
+        Printer: default printer
+
+    Raises:
+        LineTrackDesignerError: CUPS is not available
+        LineTrackDesignerError: no printers found
+
+    """
+    global _default_printer
+    if _default_printer is None:
+        _default_printer = Printer()
+    return _default_printer
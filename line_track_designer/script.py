@@ -0,0 +1,120 @@
+"""
+The **script** module applies a sequence of edits to a track, so that a
+track file is read and written once whatever the number of edits.
+
+A script has one operation per line. Blank lines and the comments
+starting with # are ignored. The operations are:
+
+* **addcol**: add a column
+* **addrow**: add a row
+* **delcol COL**: delete the column COL
+* **delrow ROW**: delete the row ROW
+* **rotate [N]**: rotate the track N times (default: 1)
+* **mirror**: mirror the track
+* **set ROW COL TILE ORIENT**: set a cell (the track grows if needed).
+  TILE ORIENT can also be written TILE;ORIENT.
+
+For example:
+
+.. code-block:: text
+
+    # Close the track
+    addcol
+    set 0 3 3 1
+    set 1 3 2;0
+    rotate 2
+
+"""
+from line_track_designer.error import LineTrackDesignerError
+
+# Number of arguments of the operations: (minimum, maximum)
+OPERATIONS = {
+    'addcol': (0, 0),
+    'addrow': (0, 0),
+    'delcol': (1, 1),
+    'delrow': (1, 1),
+    'rotate': (0, 1),
+    'mirror': (0, 0),
+    'set': (4, 4),
+}
+
+
+def parse(lines):
+    """
+    Parse the operations of a script. The whole script is checked before
+    any operation is applied.
+
+    Args:
+        lines (list of str): lines of the script
+
+    Returns:
+        list of tuple: name and integer arguments of each operation
+
+    Raises:
+        LineTrackDesignerError: invalid operation (with the line)
+
+    """
+    ops = []
+    for n, line in enumerate(lines, 1):
+        words = line.split('#', 1)[0].replace(';', ' ').split()
+        if not words:
+            continue
+        name, args = words[0].lower(), words[1:]
+        if name not in OPERATIONS:
+            raise LineTrackDesignerError(
+                    'line {}: unknown operation {!r}'.format(n, words[0]))
+        low, high = OPERATIONS[name]
+        if not low <= len(args) <= high:
+            raise LineTrackDesignerError(
+                    'line {}: {} expects {} arguments, got {}'.format(
+                        n, name, low if low == high else '{} to {}'.format(
+                            low, high), len(args)))
+        try:
+            args = [int(a) for a in args]
+        except ValueError:
+            raise LineTrackDesignerError(
+                    'line {}: invalid arguments {!r}'.format(n, line.strip()))
+        ops.append((name, args))
+    return ops
+
+
+def apply(track, ops):
+    """
+    Apply operations to a track. The consecutive set operations are
+    applied at once.
+
+    Args:
+        track (Track): track to edit
+        ops (list of tuple): operations returned by parse
+
+    Raises:
+        LineTrackDesignerError: invalid operation for the track
+
+    """
+    cells = []
+    for k, (name, args) in enumerate(ops):
+        if name == 'set':
+            cells.append(args)
+            if k + 1 < len(ops) and ops[k + 1][0] == 'set':
+                continue
+            rows, cols, tiles, orient = zip(*cells)
+            if min(rows) < 0 or min(cols) < 0:
+                raise LineTrackDesignerError(
+                        'set: negative row or column')
+            track.set_tiles(rows, cols, tiles, orient)
+            cells = []
+        elif name == 'addcol':
+            track.add_col()
+        elif name == 'addrow':
+            track.add_row()
+        elif name in ['delcol', 'delrow']:
+            delete = track.del_col if name == 'delcol' else track.del_row
+            try:
+                delete(args[0])
+            except IndexError:
+                raise LineTrackDesignerError(
+                        '{}: index {} out of range'.format(name, args[0]))
+        elif name == 'rotate':
+            track.rotate(args[0] if args else 1)
+        elif name == 'mirror':
+            track.mirror()
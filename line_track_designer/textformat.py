@@ -0,0 +1,189 @@
+"""
+The **textformat** module reads and writes the text format of the tracks
+(.txt) in pure Python, without NumPy. It is used by the commands of the
+CLI that only edit a text file, so they start quickly.
+
+A track is represented by a list of rows, each row being a list of
+(tile, orientation) pairs. For example:
+
+.. code-block:: python
+
+    rows = textformat.read('track.txt')
+    textformat.add_col(rows)
+    textformat.write('track.txt', rows)
+
+"""
+import re
+from line_track_designer.error import LineTrackDesignerError
+from line_track_designer.validation import (
+    VALID_TILES, VALID_ORIENT, invalid_values)
+
+# Regular expressions of a line and a cell of the text format
+LINE_RE = re.compile(r'[ \t]*[+-]?\d+;[+-]?\d+(?:[ \t]+[+-]?\d+;[+-]?\d+)*'
+                     r'[ \t]*')
+CELL_RE = re.compile(r'\S+')
+
+
+def split_lines(text):
+    """
+    Check the lines of the text format of a track and return them with
+    their number of cells. Blank lines and trailing whitespaces are
+    ignored.
+
+    Args:
+        text (str): text format of a track
+
+    Returns:
+        tuple: lines and number of cells per line (None if no line)
+
+    Raises:
+        LineTrackDesignerError: invalid content (with line and column)
+
+    """
+    rows = [(n, line) for n, line in enumerate(text.splitlines(), 1)
+            if line.strip()]
+    ncol = None
+    for n, line in rows:
+        if not LINE_RE.fullmatch(line):
+            for m in CELL_RE.finditer(line):
+                if not LINE_RE.fullmatch(m.group()):
+                    raise LineTrackDesignerError(
+                            'line {}, column {}: invalid cell {!r}'.format(
+                                n, m.start() + 1, m.group()))
+            raise LineTrackDesignerError('line {}: invalid line'.format(n))
+        if ncol is None:
+            ncol = line.count(';')
+        elif line.count(';') != ncol:
+            raise LineTrackDesignerError(
+                    'line {}: expected {} cells, got {}'.format(
+                        n, ncol, line.count(';')))
+    return [line for _, line in rows], ncol
+
+
+def _check(rows):
+    """Check the values of the cells with the rules of validation."""
+    for k, (label, valid) in enumerate(
+            [('tile', VALID_TILES), ('orient', VALID_ORIENT)]):
+        cells = [(cell[k], i, j) for i, row in enumerate(rows)
+                 for j, cell in enumerate(row) if cell[k] not in valid]
+        if cells:
+            raise LineTrackDesignerError(invalid_values(label, cells))
+
+
+def from_string(text):
+    """
+    Parse the text format of a track.
+
+    Args:
+        text (str): text format of a track
+
+    Returns:
+        list of list of tuple: rows of (tile, orientation) pairs
+
+    Raises:
+        LineTrackDesignerError: invalid content (with line and column)
+        LineTrackDesignerError: invalid tile/orient values
+
+    """
+    lines, _ = split_lines(text)
+    rows = [[tuple(int(v) for v in cell.split(';'))
+             for cell in line.split()] for line in lines]
+    _check(rows)
+    return rows
+
+
+def to_string(rows):
+    """
+    Make the text format of a track. It is the same as the string format
+    of the Track class.
+
+    Args:
+        rows (list of list of tuple): rows of (tile, orientation) pairs
+
+    Returns:
+        str: text format
+
+    """
+    return '\n'.join(' '.join('{};{}'.format(t, o) for t, o in row)
+                     for row in rows)
+
+
+def read(file):
+    """
+    Read a text file representing a track.
+
+    Args:
+        file (str): filename
+
+    Returns:
+        list of list of tuple: rows of (tile, orientation) pairs
+
+    Raises:
+        LineTrackDesignerError: invalid content (with line and column)
+
+    """
+    with open(file, 'r') as f:
+        return from_string(f.read())
+
+
+def write(file, rows):
+    """
+    Save a track as a text file.
+
+    Args:
+        file (str): filename
+        rows (list of list of tuple): rows of (tile, orientation) pairs
+
+    """
+    with open(file, 'w') as f:
+        f.write(to_string(rows))
+
+
+def zeros(nrow, ncol):
+    """
+    Return the rows of an empty track.
+
+    Args:
+        nrow (int): number of rows
+        ncol (int): number of columns
+
+    Returns:
+        list of list of tuple: rows of (0, 0) pairs
+
+    """
+    return [[(0, 0)] * ncol for _ in range(nrow)]
+
+
+def add_col(rows):
+    """Add a column filled with 0 to the rows of a track."""
+    for row in rows:
+        row.append((0, 0))
+
+
+def add_row(rows):
+    """Add a row filled with 0 to the rows of a track."""
+    rows.append([(0, 0)] * (len(rows[0]) if rows else 0))
+
+
+def del_col(rows, col):
+    """
+    Delete a column from the rows of a track.
+
+    Raises:
+        IndexError: invalid column
+
+    """
+    col = range(len(rows[0]) if rows else 0)[col]
+    for row in rows:
+        del row[col]
+
+
+def del_row(rows, row):
+    """
+    Delete a row from the rows of a track.
+
+    Raises:
+        IndexError: invalid row
+
+    """
+    del rows[row]
@@ -11,9 +11,188 @@ Warnings:
 """
 import os
 import logging
+import threading
+from collections import OrderedDict
+import numpy as np
 from PIL import Image
 import webbrowser
 from line_track_designer.error import LineTrackDesignerError
+from line_track_designer.validation import VALID_TILES
+
+# Sides of a tile, in the order used by the connectors
+SIDES = ('top', 'right', 'bottom', 'left')
+
+# Position in mm of the line on each side of the tiles with the
+# orientation 0 (None: no line on this side). The positions are measured
+# from the left for the top and bottom sides, and from the top for the
+# right and left sides.
+CONNECTORS = {
+    2: (100, None, 100, None),
+    3: (None, None, 100, 100),
+    4: (100, 100, 95, 100),
+    5: (100, 100, 100, 100),
+    6: (None, 100, 100, 100),
+    7: (100, 100, 100, 100),
+    8: (100, 100, 100, 100),
+    9: (None, 100, 100, 100),
+    11: (None, None, None, None),
+    12: (100, None, 100, 100),
+    13: (100, 100, 100, None),
+    14: (None, None, 100, 100),
+    15: (100, None, 100, None),
+    16: (100, None, 100, None),
+    17: (None, None, 100, None),
+    18: (100, None, 100, None),
+    19: (100, None, 100, None),
+    20: (100, None, 100, None),
+    21: (100, 100, 100, 100),
+    22: (100, None, None, None),
+    23: (100, None, 100, None),
+    24: (100, None, 100, None),
+    25: (None, None, 100, None),
+    26: (None, None, 100, None),
+    27: (None, None, 100, None),
+    28: (None, None, 100, None),
+    29: (100, None, 100, None),
+    30: (100, None, 100, None),
+    31: (100, None, 100, None),
+    33: (None, 100, 100, 100),
+}
+
+
+ARC = 157.1  # length in mm of a quarter circle of radius 100 mm
+
+# Segments of the line inside the tiles with the orientation 0:
+# (start, end, length in mm). The ends are sides (0: top, 1: right,
+# 2: bottom, 3: left) or internal points ('a', 'b', ...) where the line
+# forks or stops. The lengths of the curves are approximate.
+SEGMENTS = {
+    2: [(0, 2, 200)],
+    3: [(2, 3, ARC)],
+    4: [(0, 1, ARC), (2, 3, ARC)],
+    5: [(0, 1, ARC), (1, 2, ARC), (2, 3, ARC), (3, 0, ARC)],
+    6: [(3, 2, ARC), (2, 1, ARC)],
+    7: [(3, 0, ARC), (0, 1, ARC), (1, 2, ARC)],
+    8: [(0, 2, 200), (1, 3, 200)],
+    9: [(3, 'a', 100), ('a', 1, 100), ('a', 2, 100)],
+    11: [],
+    12: [(0, 2, 200), (3, 2, ARC)],
+    13: [(0, 2, 200), (1, 2, ARC)],
+    14: [(2, 3, 200)],
+    15: [(0, 2, 220)],
+    16: [(0, 'a', 30), ('a', 'b', 160), ('a', 'b', 160), ('b', 2, 30)],
+    17: [(2, 'a', 45), ('a', 'a', 470)],
+    18: [(0, 2, 200)],
+    19: [(0, 2, 200)],
+    20: [(0, 2, 200)],
+    21: [(0, 'a', 35), (1, 'b', 35), (2, 'c', 35), (3, 'd', 35),
+         ('a', 'b', 102), ('b', 'c', 102), ('c', 'd', 102), ('d', 'a', 102)],
+    22: [(0, 'a', 115)],
+    23: [(0, 2, 200)],
+    24: [(0, 2, 230)],
+    25: [(2, 'a', 30)],
+    26: [(2, 'a', 30)],
+    27: [(2, 'a', 30)],
+    28: [(2, 'a', 30)],
+    29: [(0, 2, 200)],
+    30: [(0, 2, 260)],
+    31: [(0, 2, 200)],
+    33: [(3, 'a', 50), ('a', 'b', 100), ('b', 1, 50),
+         (2, 'a', 110), (2, 'b', 110)],
+}
+
+# Number of different orientations of the tiles whose image is
+# symmetric by rotation (the others have 4). The orientations o and
+# o + SYMMETRY[t] of the tile t give the same image.
+SYMMETRY = {2: 2, 5: 1, 8: 1, 11: 1, 16: 2, 18: 2, 20: 2, 29: 2}
+
+# Mirror image (left-right flip) of the tiles with the orientation 0:
+# (tile, orientation). The tiles 24, 27 and 30 have no mirror image.
+MIRRORS = {
+    2: (2, 0), 3: (3, 1), 4: (4, 1), 5: (5, 0), 6: (6, 0), 7: (7, 1),
+    8: (8, 0), 9: (9, 0), 11: (11, 0), 12: (13, 0), 13: (12, 0),
+    14: (14, 1), 15: (15, 2), 16: (16, 0), 17: (17, 0), 18: (18, 0),
+    19: (19, 0), 20: (20, 0), 21: (21, 0), 22: (22, 0), 23: (23, 0),
+    25: (25, 0), 26: (26, 0), 28: (28, 0), 29: (29, 0), 31: (31, 0),
+    33: (33, 0),
+}
+
+
+def rotate_segments(segments, orient):
+    """
+    Rotate the segments of a tile by 90*orient degrees
+    (counterclockwise, like the images of the tiles).
+
+    Args:
+        segments (list of tuple): segments of the tile
+        orient (int): orientation of the tile
+
+    Returns:
+        list of tuple: segments of the rotated tile
+
+    """
+    def rotate(end):
+        return end if isinstance(end, str) else (end - orient) % 4
+
+    return [(rotate(a), rotate(b), length) for a, b, length in segments]
+
+
+def rotate_connectors(connectors, orient):
+    """
+    Rotate the connectors of a tile by 90*orient degrees
+    (counterclockwise, like the images of the tiles).
+
+    Args:
+        connectors (tuple): positions of the line on the top, right,
+            bottom and left sides
+        orient (int): orientation of the tile
+
+    Returns:
+        tuple: positions of the line on the sides of the rotated tile
+
+    """
+    def flip(pos):
+        return None if pos is None else Tile.SIDE - pos
+
+    for _ in range(orient % 4):
+        top, right, bottom, left = connectors
+        connectors = (right, flip(bottom), left, flip(top))
+    return connectors
+
+
+def _connector_table():
+    """
+    Make the lookup table of the connectors: the element [t, o, s] is the
+    position of the line on the side s of the tile t with the orientation
+    o, or NaN if there is no line. The empty cells (0) have no line.
+    """
+    table = np.full((34, 4, 4), np.nan)
+    for number, connectors in CONNECTORS.items():
+        for orient in range(4):
+            table[number, orient] = [
+                np.nan if pos is None else pos
+                for pos in rotate_connectors(connectors, orient)]
+    return table
+
+
+def _symmetry_tables():
+    """
+    Make the lookup tables of the symmetries: the element [t, o] of the
+    first table is the smallest orientation giving the same image as the
+    tile t with the orientation o, and the elements [t, o] of the next
+    ones are the tile and the orientation of its mirror image (0 if the
+    tile has no mirror image). The empty cells (0) are their own image.
+    """
+    canonical = np.zeros((34, 4), dtype=np.uint8)
+    mirror_tiles = np.zeros((34, 4), dtype=np.uint8)
+    mirror_orient = np.zeros((34, 4), dtype=np.uint8)
+    for number in CONNECTORS:
+        canonical[number] = np.arange(4) % SYMMETRY.get(number, 4)
+    for number, (image, orient) in MIRRORS.items():
+        # Flipping a rotated tile is rotating the flipped tile backwards
+        mirror_tiles[number] = image
+        mirror_orient[number] = (orient - np.arange(4)) % 4
+    return canonical, mirror_tiles, mirror_orient
 
 
 class Tile:
@@ -26,8 +205,12 @@ class Tile:
     * **path**: path to the PNG image corresponding to the tile
     * **image**: PIL.Image format associated to the tile
 
+    The image is decoded the first time it is used.
+
     """
     SIDE = 200  # side of a tile in mm
+    PIXELS = 1575  # side of the image of a tile in pixels
+    LINE_WIDTH = 16  # width of the line in mm
 
     @staticmethod
     def is_valid(number):
@@ -43,7 +226,7 @@ class Tile:
             bool: Is a valid number
 
         """
-        return number >= 2 and number < 34 and number not in [10, 32]
+        return number != 0 and number in VALID_TILES
 
     def __init__(self, number):
         """
@@ -61,7 +244,8 @@ class Tile:
             self._name = 'linefollowtiles-{}.png'.format(str(number).zfill(2))
             cwd = os.path.dirname(os.path.abspath(__file__))
             self._path = os.path.join(cwd, 'png', self._name)
-            self._image = Image.open(self._path)
+            self._image = None
+            self._lock = threading.Lock()
         else:
             raise LineTrackDesignerError('Tile {} is not valid'.format(number))
         logging.info('Tile {} created'.format(number))
@@ -83,7 +267,22 @@ class Tile:
 
     @property
     def image(self):
-        """Get the image associated to the tile."""
+        """
+        Get the image associated to the tile.
+        The PNG file is decoded on the first access.
+        """
+        if self._image is None:
+            with self._lock:
+                if self._image is None:
+                    with Image.open(self.path) as img:
+                        img.load()
+                        # Palette images can not be resized with
+                        # antialiasing
+                        if img.mode == 'P':
+                            self._image = img.convert('RGB')
+                        else:
+                            self._image = img.copy()
+                    logging.info('Tile {} decoded'.format(self.number))
         return self._image
 
     def __str__(self):
@@ -97,6 +296,36 @@ class Tile:
         """
         return str(self)
 
+    def connectors(self, orient=0):
+        """
+        Return the positions in mm of the line on the top, right, bottom
+        and left sides of the tile (None if there is no line on a side).
+
+        Args:
+            orient (int): orientation of the tile (default: 0)
+
+        Returns:
+            tuple: positions of the line on each side
+
+        """
+        return rotate_connectors(CONNECTORS[self.number], orient)
+
+    def segments(self, orient=0):
+        """
+        Return the segments of the line inside the tile. A segment is a
+        tuple (start, end, length in mm), where the ends are sides
+        (0: top, 1: right, 2: bottom, 3: left) or internal points
+        ('a', 'b', ...) where the line forks or stops.
+
+        Args:
+            orient (int): orientation of the tile (default: 0)
+
+        Returns:
+            list of tuple: segments of the tile
+
+        """
+        return rotate_segments(SEGMENTS[self.number], orient)
+
     def show(self, orient=0):
         """
         Show the tile in your picture viewer.
@@ -111,34 +340,280 @@ class Tile:
         if orient not in [0, 1, 2, 3]:
             raise LineTrackDesignerError(
                     '{} is not a valid orient value'.format(orient))
-        img = self.image.rotate(90*orient)
+        img = tile_cache.get_image(self.number, orient)
         img.show(title=self.name)
         logging.info('Showing tile')
 
 
+CONNECTOR_TABLE = _connector_table()
+CANONICAL_ORIENT, MIRROR_TILES, MIRROR_ORIENT = _symmetry_tables()
+
+
+class TileCache:
+    """
+    Thread-safe cache of tiles shared by the whole process.
+    A tile is created the first time it is requested and kept for the
+    next renders, so each PNG file is decoded at most once.
+
+    The cache also keeps the bitmaps of the tiles for each orientation,
+    resolution and mode (the variants), so that a rotated or resized
+    tile is computed only once. Rotations use lossless transposes.
+
+    If **maxsize** is set, the least recently used tiles are dropped when
+    the cache is full. The variants are limited by **maxbytes** (and by
+    **maxvariants** if it is set): the least recently used variants are
+    dropped when their bitmaps take more bytes. By default, the number
+    of tiles is unlimited and the variants take at most 256 MiB.
+    """
+    ROTATIONS = (None, Image.ROTATE_90, Image.ROTATE_180, Image.ROTATE_270)
+
+    def __init__(self, maxsize=None, maxvariants=None, maxbytes=256 << 20):
+        """
+        Init an empty cache.
+
+        Args:
+            maxsize (int): maximum number of tiles kept (default: None)
+            maxvariants (int): maximum number of variants kept
+                (default: None)
+            maxbytes (int): maximum number of bytes of the variants kept
+                (default: 256 MiB)
+
+        Raises:
+            LineTrackDesignerError: invalid maxsize value
+
+        """
+        for value in [maxsize, maxvariants, maxbytes]:
+            self._check_maxsize(value)
+        self._maxsize = maxsize
+        self._maxvariants = maxvariants
+        self._maxbytes = maxbytes
+        self._tiles = OrderedDict()
+        self._variants = OrderedDict()
+        self._pending = {}
+        self._nbytes = 0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _check_maxsize(maxsize):
+        if maxsize is not None and maxsize < 1:
+            raise LineTrackDesignerError(
+                    '{} is not a valid maxsize value'.format(maxsize))
+
+    @property
+    def maxsize(self):
+        """Get the maximum number of tiles kept in the cache."""
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize):
+        """Set the maximum number of tiles kept in the cache."""
+        self._check_maxsize(maxsize)
+        with self._lock:
+            self._maxsize = maxsize
+            self._evict()
+
+    @property
+    def maxvariants(self):
+        """Get the maximum number of variants kept in the cache."""
+        return self._maxvariants
+
+    @maxvariants.setter
+    def maxvariants(self, maxvariants):
+        """Set the maximum number of variants kept in the cache."""
+        self._check_maxsize(maxvariants)
+        with self._lock:
+            self._maxvariants = maxvariants
+            self._evict()
+
+    @property
+    def maxbytes(self):
+        """Get the maximum number of bytes of the variants."""
+        return self._maxbytes
+
+    @maxbytes.setter
+    def maxbytes(self, maxbytes):
+        """Set the maximum number of bytes of the variants."""
+        self._check_maxsize(maxbytes)
+        with self._lock:
+            self._maxbytes = maxbytes
+            self._evict()
+
+    def __len__(self):
+        """Return the number of tiles in the cache."""
+        return len(self._tiles)
+
+    def __contains__(self, number):
+        """Return True if the tile is in the cache."""
+        return number in self._tiles
+
+    @property
+    def nb_variants(self):
+        """Get the number of variants in the cache."""
+        return len(self._variants)
+
+    @property
+    def nbytes(self):
+        """Get the number of bytes of the variants in the cache."""
+        return self._nbytes
+
+    @staticmethod
+    def _image_bytes(image):
+        return image.width * image.height * len(image.getbands())
+
+    def _evict(self):
+        if self._maxsize is not None:
+            while len(self._tiles) > self._maxsize:
+                self._tiles.popitem(last=False)
+        while self._variants and (
+                (self._maxvariants is not None
+                 and len(self._variants) > self._maxvariants)
+                or (self._maxbytes is not None
+                    and self._nbytes > self._maxbytes)):
+            _, image = self._variants.popitem(last=False)
+            self._nbytes -= self._image_bytes(image)
+
+    def _store(self, key, image):
+        """Keep a variant, unless it is bigger than the whole cache."""
+        size = self._image_bytes(image)
+        if self._maxbytes is None or size <= self._maxbytes:
+            self._variants[key] = image
+            self._nbytes += size
+            self._evict()
+
+    def get_tile(self, number):
+        """
+        Get a tile from its number. The tile is created if it is not
+        in the cache.
+
+        Args:
+            number (int): number of the tile
+
+        Returns:
+            Tile: tile associated to the number
+
+        Raises:
+            LineTrackDesignerError: tile not found
+
+        """
+        with self._lock:
+            if number in self._tiles:
+                self._tiles.move_to_end(number)
+                return self._tiles[number]
+            if not Tile.is_valid(number):
+                raise LineTrackDesignerError(
+                        'tile {} not found'.format(number))
+            tile = Tile(number)
+            self._tiles[number] = tile
+            self._evict()
+            return tile
+
+    def get_image(self, number, orient=0, side=None, mode=None):
+        """
+        Get the image of a tile rotated by 90*orient degrees,
+        resized to side*side pixels and converted to mode. The image is
+        computed only the first time and must not be modified.
+
+        Only the images in the requested mode are kept: the tile is
+        resized in the mode of its PNG file, then converted.
+
+        Args:
+            number (int): number of the tile
+            orient (int): orientation of the tile (default: 0)
+            side (int): side of the image in pixels (default: full size)
+            mode (str): mode of the image (default: mode of the PNG file)
+
+        Returns:
+            Image: image of the tile
+
+        Raises:
+            LineTrackDesignerError: tile not found
+            LineTrackDesignerError: invalid orient value
+
+        """
+        if orient not in [0, 1, 2, 3]:
+            raise LineTrackDesignerError(
+                    '{} is not a valid orient value'.format(orient))
+        key = (int(number), int(orient), side, mode)
+        with self._lock:
+            if key in self._variants:
+                self._variants.move_to_end(key)
+                return self._variants[key]
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = threading.Event()
+        if pending is not None:
+            # Another thread is computing this image
+            pending.wait()
+            return self.get_image(number, orient, side, mode)
+        # The image is computed without the lock, so that the threads
+        # rendering a track resize different tiles at the same time
+        image = None
+        try:
+            tile = self.get_tile(number)
+            image = tile.image
+            if side is not None and image.size != (side, side):
+                if orient != 0:
+                    image = self.get_image(number, 0, side, mode)
+                else:
+                    image = image.resize((side, side), Image.LANCZOS)
+            if mode is not None and image.mode != mode:
+                image = image.convert(mode)
+            if orient != 0:
+                image = image.transpose(TileCache.ROTATIONS[orient])
+        finally:
+            with self._lock:
+                # The full size image of the tile is already kept by the
+                # tile
+                if image is not None and image is not tile.image:
+                    self._store(key, image)
+                self._pending.pop(key).set()
+        return image
+
+    def clear(self):
+        """Remove all the tiles and variants from the cache."""
+        with self._lock:
+            self._tiles.clear()
+            self._variants.clear()
+            self._nbytes = 0
+        logging.info('Tile cache cleared')
+
+
+tile_cache = TileCache()
+
+
 class Tiles:
     """
     Manage all the tiles.
     The tiles are stocked in the dictionary **dict_tiles**.
     The keys correspond to the number of the tile and the values are
     the Tile objects corresponding to this number.
+
+    The tiles are shared with the other instances through the
+    process-wide **tile_cache**, so creating a Tiles object is cheap.
     """
-    def __init__(self):
+    def __init__(self, cache=None):
         """
-        Init the tiles. It creates the dictionary **dict_tiles**.
+        Init the tiles.
+
+        Args:
+            cache (TileCache): cache to use (default: tile_cache)
+
         """
-        self._dict_tiles = {}
-        for i in range(2, 34):
-            if i not in [10, 32]:
-                self._dict_tiles[i] = Tile(i)
+        self._cache = tile_cache if cache is None else cache
         logging.info('Tiles created')
 
+    @property
+    def cache(self):
+        """Get the cache of tiles."""
+        return self._cache
+
     @property
     def dict_tiles(self):
         """
         Get the dictionary of tiles.
         """
-        return self._dict_tiles
+        return {i: self.cache.get_tile(i)
+                for i in range(2, 34) if Tile.is_valid(i)}
 
     def __str__(self):
         """
@@ -168,9 +643,7 @@ class Tiles:
             LineTrackDesignerError: tile not found
 
         """
-        if number in self.dict_tiles:
-            return self.dict_tiles[number]
-        raise LineTrackDesignerError('tile {} not found'.format(number))
+        return self.cache.get_tile(number)
 
     @staticmethod
     def show():
@@ -3,14 +3,194 @@ With the **track** module, you can create, import, edit, save, and
 export tracks.
 
 """
+import os
+import tempfile
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import struct
 import numpy as np
 from PIL import Image
 import logging
-from line_track_designer.printer import Printer
-from line_track_designer.tile import Tile, Tiles
+from line_track_designer.tile import (
+    Tile, Tiles, TileCache, CONNECTOR_TABLE, CANONICAL_ORIENT, MIRROR_TILES,
+    MIRROR_ORIENT)
 from line_track_designer.error import LineTrackDesignerError
+from line_track_designer import textformat
+from line_track_designer.validation import (
+    NB_TILES, NB_ORIENT, VALID_TILES, VALID_ORIENT, invalid_values)
 from line_track_designer.markdown import Markdown
+from line_track_designer.pngwriter import PNGWriter
+from line_track_designer.pdfwriter import PDFReader, PDFWriter
+from line_track_designer.graph import PathGraph
+from line_track_designer.generator import Generator, default_generator
+
+
+# Version of the images in the render cache. Increase it when the
+# rendering or the images of the tiles change, so the images saved by
+# the previous versions are not used anymore.
+RENDER_VERSION = 1
+
+# Lookup table of the valid values of a cell (0 is an empty cell)
+_VALID_TILES = np.array([i in VALID_TILES for i in range(NB_TILES)])
+
+
+def _invalid_cells(values, mask, label, rows=None, cols=None):
+    """
+    Make the error message listing the cells selected by mask.
+    The coordinates of the cells are given by rows and cols, or by the
+    position of the values in the array.
+    """
+    cells = []
+    for k in map(tuple, np.argwhere(mask)):
+        pos = k if rows is None else (rows[k], cols[k])
+        cells.append((values[k],) + tuple(pos))
+    return invalid_values(label, cells)
+
+
+def _check_values(tiles, orient, rows=None, cols=None):
+    """
+    Check the values of tiles and orientations with the lookup table.
+    Every invalid cell is reported in the error.
+    """
+    tiles, orient = np.atleast_1d(tiles, orient)
+    in_range = (tiles >= 0) & (tiles < _VALID_TILES.size)
+    bad_tiles = ~in_range
+    bad_tiles[in_range] = ~_VALID_TILES[tiles[in_range].astype(int)]
+    if bad_tiles.any():
+        raise LineTrackDesignerError(
+                _invalid_cells(tiles, bad_tiles, 'tile', rows, cols))
+    bad_orient = (orient < 0) | (orient >= NB_ORIENT)
+    if bad_orient.any():
+        raise LineTrackDesignerError(
+                _invalid_cells(orient, bad_orient, 'orient', rows, cols))
+
+
+_tiles_pdf = None
+
+
+def _tiles_reader():
+    """Return the reader of the PDF file of the tiles. It is read once."""
+    global _tiles_pdf
+    if _tiles_pdf is None:
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        _tiles_pdf = PDFReader(os.path.join(cwd, 'pdf', 'linefollowtiles.pdf'))
+    return _tiles_pdf
+
+
+def _mirror_arrays(tiles, orient):
+    """
+    Return the arrays of the mirror image of a track.
+    Raise an error if a tile has no mirror image.
+    """
+    mirror_tiles = MIRROR_TILES[tiles, orient]
+    bad = (mirror_tiles == 0) & (tiles != 0)
+    if bad.any():
+        raise LineTrackDesignerError(
+                'no mirror image for the tiles: {}'.format(
+                    ', '.join(map(str, np.unique(tiles[bad])))))
+    return (np.fliplr(mirror_tiles),
+            np.fliplr(MIRROR_ORIENT[tiles, orient]))
+
+
+# Classes of the characters of the text format: other, digit, sign,
+# semicolon, blank and end of line
+_OTHER, _DIGIT, _SIGN, _SEMI, _BLANK, _EOL = range(6)
+_CLASSES = {'0123456789': _DIGIT, '+-': _SIGN, ';': _SEMI, ' \t': _BLANK,
+            '\n\r': _EOL}
+# Translation table of the bytes to their classes
+_CHARS = bytes(next((v for k, v in _CLASSES.items() if chr(c) in k), _OTHER)
+               for c in range(256))
+
+
+def _scan(text):
+    """
+    Check the text format of a track with NumPy and return the arrays of
+    tiles and orientations, or None if the text is not a valid track or
+    can not be checked this way (non ASCII characters, huge values).
+    """
+    try:
+        data = ('\n' + text + '\n').encode('ascii')
+    except UnicodeEncodeError:
+        return None
+    chars = np.frombuffer(data.translate(_CHARS), dtype=np.uint8)
+    if (chars == _OTHER).any():
+        return None
+    # A sign starts a number, a semicolon is between two numbers
+    signs = np.flatnonzero(chars == _SIGN)
+    semis = np.flatnonzero(chars == _SEMI)
+    if ((chars[signs + 1] != _DIGIT).any()
+            or (chars[signs - 1] == _DIGIT).any()
+            or (chars[semis - 1] != _DIGIT).any()
+            or ((chars[semis + 1] != _DIGIT)
+                & (chars[semis + 1] != _SIGN)).any()):
+        return None
+    # The numbers are followed in turn by a semicolon and by a blank or
+    # the end of the line, so each cell has exactly two numbers
+    digit = chars == _DIGIT
+    ends = np.flatnonzero(digit[:-1] & ~digit[1:])
+    follow = chars[ends + 1]
+    if (len(ends) % 2 or (follow[::2] != _SEMI).any()
+            or (follow[1::2] == _SEMI).any()):
+        return None
+    if not len(ends):
+        return np.zeros((0, 0), dtype=int), np.zeros((0, 0), dtype=int)
+    starts = np.flatnonzero(~digit[:-1] & digit[1:]) + 1
+    if (ends - starts >= 18).any():
+        return None
+    # Blank lines have no cell, the others have the same number of cells
+    lines = np.searchsorted(np.flatnonzero(chars == _EOL), semis)
+    counts = np.bincount(lines)
+    counts = counts[counts > 0]
+    if (counts != counts[0]).any():
+        return None
+    values = np.fromstring(text.replace(';', ' '), dtype=int, sep=' ')
+    values = values.reshape(len(counts), counts[0], 2)
+    return values[:, :, 0].copy(), values[:, :, 1].copy()
+
+
+def _parse(text):
+    """
+    Parse the text format of a track and return the arrays of tiles
+    and orientations. Blank lines and trailing whitespaces are ignored.
+    """
+    arrays = _scan(text)
+    if arrays is not None:
+        return arrays
+    # The pure Python parser reports the line and column of the errors
+    rows = textformat.from_string(text)
+    if not rows:
+        return np.zeros((0, 0), dtype=int), np.zeros((0, 0), dtype=int)
+    values = np.array(rows, dtype=int)
+    return values[:, :, 0].copy(), values[:, :, 1].copy()
+
+
+# Header of the binary format: magic, version, reserved byte,
+# length of the name, number of rows and number of columns.
+# The header is followed by the name (UTF-8) and one byte per cell,
+# row by row: tile << 2 | orient.
+_BIN_HEADER = struct.Struct('<4sBBHII')
+_BIN_MAGIC = b'LTRK'
+_BIN_VERSION = 1
+
+
+def _unpack_bin(data, file):
+    """
+    Read the header of the binary format and return the name, the shape
+    and the offset of the cells.
+    """
+    if len(data) < _BIN_HEADER.size:
+        raise LineTrackDesignerError('{} is truncated'.format(file))
+    magic, version, _, name_len, nrow, ncol = _BIN_HEADER.unpack_from(data)
+    if magic != _BIN_MAGIC:
+        raise LineTrackDesignerError(
+                '{} is not a binary track file'.format(file))
+    if version != _BIN_VERSION:
+        raise LineTrackDesignerError(
+                'unsupported binary track version: {}'.format(version))
+    offset = _BIN_HEADER.size + name_len
+    name = bytes(data[_BIN_HEADER.size:offset]).decode()
+    return name, (nrow, ncol), offset
 
 
 class Track:
@@ -22,16 +202,29 @@ class Track:
     * **orient**: array which indicates the orientation of each tile
     * **name**: name of the track
 
+    The arrays are stored with the uint8 type, whatever the type of the
+    arrays given to the constructor. Use ``astype(int)`` on them if you
+    need wider values for your own computations.
+
+    The tracks read from a binary file keep their cells in a memory map of
+    the file: they are decoded into the arrays the first time they are
+    needed. Getting cells with ``track[key]`` and saving the image with
+    streaming only read the rows they use.
+
     """
     @staticmethod
-    def read(file, name='track'):
+    def read(file, name=None):
         """
-        Read a text file representing a track
-        and return the track associated.
+        Read a file representing a track and return the track associated.
+        The format depends on the extension: text format (.txt) or
+        binary format (.trk).
+        The file can also be a file object: binary content is detected
+        from its header.
 
         Args:
-            file (str): filename
-            name (str): name of the track
+            file (str): filename or file object
+            name (str): name of the track (default: the name stored in
+                a binary file, or 'track')
 
         Returns:
             Track: the track associated to the file
@@ -39,32 +232,113 @@ class Track:
         Raises:
             LineTrackDesignerError: file not found
             LineTrackDesignerError: bad filename extension: requires .txt
+                or .trk
+            LineTrackDesignerError: invalid content (with line and column)
+
+        """
+        if hasattr(file, 'read'):
+            text = file.read()
+            if isinstance(text, bytes):
+                if text.startswith(_BIN_MAGIC):
+                    return Track._from_bin(text, file, name)
+                text = text.decode()
+        else:
+            p = Path(file)
+            if not p.is_file():
+                raise LineTrackDesignerError('file {} not found'.format(file))
+            if p.suffix == '.trk':
+                return Track.read_bin(file, name)
+            if p.suffix != '.txt':
+                raise LineTrackDesignerError(
+                        'bad filename extension: requires .txt or .trk')
+            with open(file, 'r') as f:
+                text = f.read()
+        track = Track.from_string(text, name or 'track')
+        logging.info('Reading track: {}'.format(file))
+        return track
+
+    @staticmethod
+    def read_bin(file, name=None):
+        """
+        Read a binary file representing a track and return the track
+        associated. Only the header is read: the cells are memory-mapped
+        and decoded when they are used, so the values of the cells are
+        checked at this time.
+
+        Args:
+            file (str): filename
+            name (str): name of the track (default: the name stored in
+                the file)
+
+        Returns:
+            Track: the track associated to the file
+
+        Raises:
+            LineTrackDesignerError: file not found
+            LineTrackDesignerError: invalid binary file
 
         """
         try:
-            f = open(file, 'r')
+            f = open(file, 'rb')
         except IOError:
             raise LineTrackDesignerError('file {} not found'.format(file))
-        p = Path(file)
-        if p.suffix != '.txt':
-            raise LineTrackDesignerError(
-                    'bad filename extension: requires .txt')
-        lines = f.readlines()
-        f.close()
-        tiles, orient = [], []
-        for line in lines:
-            line = line.strip('\n').split(' ')
-            lt, lo = [], []
-            for i in line:
-                t, o = i.split(';')
-                lt.append(int(t))
-                lo.append(int(o))
-            tiles.append(lt)
-            orient.append(lo)
+        with f:
+            header = f.read(_BIN_HEADER.size)
+            if len(header) == _BIN_HEADER.size:
+                header += f.read(_BIN_HEADER.unpack(header)[3])
+            size = f.seek(0, 2)
+        stored, shape, offset = _unpack_bin(header, file)
+        if size < offset + shape[0]*shape[1]:
+            raise LineTrackDesignerError('{} is truncated'.format(file))
+        if shape[0]*shape[1] == 0:
+            cells = np.zeros(shape, dtype=np.uint8)
+        else:
+            cells = np.memmap(file, np.uint8, 'r', offset, shape)
         logging.info('Reading track: {}'.format(file))
-        return Track(
-            np.array(tiles, dtype=int),
-            np.array(orient, dtype=int), name)
+        return Track._from_cells(cells, name or stored)
+
+    @staticmethod
+    def _from_bin(data, file, name):
+        """Create a track from the content of a binary file."""
+        stored, shape, offset = _unpack_bin(data, file)
+        if len(data) < offset + shape[0]*shape[1]:
+            raise LineTrackDesignerError('{} is truncated'.format(file))
+        cells = np.frombuffer(
+            data, np.uint8, shape[0]*shape[1], offset).reshape(shape)
+        logging.info('Reading track: {}'.format(file))
+        return Track._from_cells(cells, name or stored)
+
+    @staticmethod
+    def _from_cells(cells, name):
+        """
+        Create a track from packed cells (tile << 2 | orient). The cells
+        are decoded when the arrays of the track are first used.
+        """
+        track = Track.__new__(Track)
+        track._name = name
+        track._render = None
+        track._shape = cells.shape
+        track._cells = cells
+        return track
+
+    @staticmethod
+    def from_string(text, name='track'):
+        """
+        Create a track from its string format.
+
+        Args:
+            text (str): string format of the track
+            name (str): name of the track
+
+        Returns:
+            Track: the track associated to the text
+
+        Raises:
+            LineTrackDesignerError: invalid content (with line and column)
+
+        """
+        tiles, orient = _parse(text)
+        return Track(tiles, orient, name)
 
     @staticmethod
     def zeros(nrow, ncol, name='track'):
@@ -80,10 +354,47 @@ class Track:
             Track: empty track (only zeros)
 
         """
-        tiles = np.zeros((nrow, ncol), dtype=int)
-        orient = np.zeros((nrow, ncol), dtype=int)
+        tiles = np.zeros((nrow, ncol), dtype=np.uint8)
+        orient = np.zeros((nrow, ncol), dtype=np.uint8)
         return Track(tiles, orient, name)
 
+    @staticmethod
+    def generate(nrow, ncol, seed=None, constraints=None, tiles=None,
+                 weights=None, name='track'):
+        """
+        Generate a random track whose line is continuous and doesn't
+        leave the track. The same seed always gives the same track.
+
+        For example, to generate a track with a cross in the middle:
+
+        .. code-block:: python
+
+            track = Track.generate(5, 5, seed=1, constraints={(2, 2): (8, 0)})
+
+        Args:
+            nrow (int): number of rows
+            ncol (int): number of columns
+            seed (int): seed of the random generator (default: None)
+            constraints (dict): fixed cells {(row, col): (tile, orient)}
+            tiles (list of int): tiles that can be used (default: all)
+            weights (dict): relative probability of each tile (default: 1)
+            name (str): name of the track
+
+        Returns:
+            Track: random track
+
+        Raises:
+            LineTrackDesignerError: unable to generate the track
+
+        """
+        if tiles is None and weights is None:
+            generator = default_generator()
+        else:
+            generator = Generator(tiles, weights)
+        t, o = generator.generate(nrow, ncol, seed, constraints)
+        logging.info('Track generated')
+        return Track(t, o, name)
+
     @staticmethod
     def max_shape(width, height):
         """
@@ -103,6 +414,7 @@ class Track:
     def __init__(self, tiles, orient, name='track'):
         """
         Init a track. The arguments tiles and orient must be numpy arrays.
+        They are copied and converted to uint8 arrays.
         For example:
 
         .. code-block:: python
@@ -136,30 +448,85 @@ class Track:
         if (tiles.shape != orient.shape):
             raise LineTrackDesignerError(
                     'tiles and orient must have the same shape')
-        nrow, ncol = tiles.shape
-        for i in range(nrow):
-            for j in range(ncol):
-                t, o = tiles[i][j], orient[i][j]
-                if t != 0 and not Tile.is_valid(t):
-                    raise LineTrackDesignerError(
-                            '{} is not a valid tile value'.format(t))
-                if not 0 <= o <= 3:
-                    raise LineTrackDesignerError(
-                            '{} is not a valid orient value'.format(o))
+        _check_values(tiles, orient)
         self._name = name
-        self._tiles = tiles.copy()
-        self._orient = orient.copy()
+        self._render = None
+        self._set_arrays(tiles, orient)
         logging.info('Track created')
 
+    def __getattr__(self, attr):
+        # The arrays of a track read from a binary file are decoded the
+        # first time they are used
+        cells = self.__dict__.get('_cells')
+        if attr not in ('_tiles', '_orient') or cells is None:
+            raise AttributeError(attr)
+        tiles, orient = cells >> 2, cells & 3
+        _check_values(tiles, orient)
+        self._tiles, self._orient = tiles, orient
+        del self._cells
+        return getattr(self, attr)
+
+    def _set_arrays(self, tiles, orient):
+        """Replace the arrays of the track. They are copied."""
+        self._tiles = np.array(tiles, dtype=np.uint8)
+        self._orient = np.array(orient, dtype=np.uint8)
+        self._shape = self._tiles.shape
+
+    def _resize(self, nrow, ncol):
+        """
+        Grow the track to nrow rows and ncol columns. The new cells are
+        filled with 0. The arrays are stored in larger buffers whose
+        capacity grows geometrically, so adding rows or columns one by
+        one costs an amortized constant time per cell.
+        """
+        old_nrow, old_ncol = self._shape
+        cap_row, cap_col = self._tiles.shape
+        if nrow > cap_row or ncol > cap_col:
+            cap = (max(nrow, 2*cap_row) if nrow > cap_row else cap_row,
+                   max(ncol, 2*cap_col) if ncol > cap_col else cap_col)
+            tiles = np.zeros(cap, dtype=np.uint8)
+            orient = np.zeros(cap, dtype=np.uint8)
+            tiles[:old_nrow, :old_ncol] = self.tiles
+            orient[:old_nrow, :old_ncol] = self.orient
+            self._tiles, self._orient = tiles, orient
+        else:
+            for a in [self._tiles, self._orient]:
+                a[old_nrow:nrow, :ncol] = 0
+                a[:nrow, old_ncol:ncol] = 0
+        self._shape = (nrow, ncol)
+        if self._render is not None:
+            img, side, dirty = self._render
+            new_img = Image.new('RGB', (ncol*side, nrow*side))
+            new_img.paste(img, (0, 0))
+            new_dirty = np.ones((nrow, ncol), dtype=bool)
+            new_dirty[:old_nrow, :old_ncol] = dirty
+            self._render = (new_img, side, new_dirty)
+
     @property
     def tiles(self):
-        """Get the array of tiles."""
-        return self._tiles
+        """
+        Get the array of tiles. It is a view of the track: the cells
+        written through it are not marked as modified, so an image kept
+        by export_img would not render them again. Use set_tile,
+        set_tiles or ``track[key] = value`` to modify the track.
+        """
+        nrow, ncol = self._shape
+        return self._tiles[:nrow, :ncol]
 
     @property
     def orient(self):
-        """Get the array of orientations."""
-        return self._orient
+        """
+        Get the array of orientations. Like the array of tiles, it is a
+        view of the track whose writes are not seen by the incremental
+        rendering.
+        """
+        nrow, ncol = self._shape
+        return self._orient[:nrow, :ncol]
+
+    def _mark_dirty(self, key):
+        """Mark cells to render again in the last rendered image."""
+        if self._render is not None:
+            self._render[2][key] = True
 
     @property
     def name(self):
@@ -195,23 +562,49 @@ class Track:
         """
         return str(self)
 
+    def __eq__(self, other):
+        """
+        Return True if the tracks have the same tiles and orientations.
+        The names are not compared.
+        """
+        if not isinstance(other, Track):
+            return NotImplemented
+        return (self.tiles.shape == other.tiles.shape
+                and np.array_equal(self.tiles, other.tiles)
+                and np.array_equal(self.orient, other.orient))
+
+    __hash__ = None
+
+    def digest(self):
+        """
+        Return a canonical hash of the track. It only depends on the shape,
+        the tiles and the orientations, so two equal tracks have the same
+        digest, whatever their names and the way they were built.
+
+        Returns:
+            str: SHA-256 hexadecimal digest
+
+        """
+        h = hashlib.sha256()
+        h.update(struct.pack('<II', *self.tiles.shape))
+        h.update(np.ascontiguousarray(self.tiles).tobytes())
+        h.update(np.ascontiguousarray(self.orient).tobytes())
+        return h.hexdigest()
+
     def add_col(self):
         """
         Add a column to the track. This column is filled with 0.
         """
-        new_col = np.zeros(self.tiles.shape[0], dtype=int)
-        new_col = np.atleast_2d(new_col).T
-        self._tiles = np.hstack([self.tiles, new_col])
-        self._orient = np.hstack([self.orient, new_col])
+        nrow, ncol = self._shape
+        self._resize(nrow, ncol + 1)
         logging.info('Column added to track')
 
     def add_row(self):
         """
         Add a row to the track. This row is filled with 0.
         """
-        new_row = np.zeros(self.tiles.shape[1], dtype=int)
-        self._tiles = np.vstack([self.tiles, new_row])
-        self._orient = np.vstack([self.orient, new_row])
+        nrow, ncol = self._shape
+        self._resize(nrow + 1, ncol)
         logging.info('Row added to track')
 
     def del_col(self, col):
@@ -222,8 +615,19 @@ class Track:
             col (int): index of the column to delete
 
         """
-        self._tiles = np.delete(self.tiles, col, axis=1)
-        self._orient = np.delete(self.orient, col, axis=1)
+        nrow, ncol = self._shape
+        col = range(ncol)[col]
+        for a in [self._tiles, self._orient]:
+            a[:nrow, col:ncol-1] = a[:nrow, col+1:ncol]
+            a[:nrow, ncol-1] = 0
+        self._shape = (nrow, ncol - 1)
+        if self._render is not None:
+            img, side, dirty = self._render
+            new_img = Image.new('RGB', ((ncol-1)*side, nrow*side))
+            new_img.paste(img.crop((0, 0, col*side, nrow*side)), (0, 0))
+            new_img.paste(img.crop(((col+1)*side, 0, ncol*side, nrow*side)),
+                          (col*side, 0))
+            self._render = (new_img, side, np.delete(dirty, col, axis=1))
         logging.info('Column deleted from track')
 
     def del_row(self, row):
@@ -234,8 +638,19 @@ class Track:
             row (int): index of the row to delete
 
         """
-        self._tiles = np.delete(self.tiles, row, axis=0)
-        self._orient = np.delete(self.orient, row, axis=0)
+        nrow, ncol = self._shape
+        row = range(nrow)[row]
+        for a in [self._tiles, self._orient]:
+            a[row:nrow-1, :ncol] = a[row+1:nrow, :ncol]
+            a[nrow-1, :ncol] = 0
+        self._shape = (nrow - 1, ncol)
+        if self._render is not None:
+            img, side, dirty = self._render
+            new_img = Image.new('RGB', (ncol*side, (nrow-1)*side))
+            new_img.paste(img.crop((0, 0, ncol*side, row*side)), (0, 0))
+            new_img.paste(img.crop((0, (row+1)*side, ncol*side, nrow*side)),
+                          (0, row*side))
+            self._render = (new_img, side, np.delete(dirty, row, axis=0))
         logging.info('Row deleted from track')
 
     def set_tile(self, row, col, tile, orient):
@@ -252,23 +667,179 @@ class Track:
             LineTrackDesignerError: invalid tile/orient value
 
         """
-        if tile != 0 and not Tile.is_valid(tile):
+        if tile not in VALID_TILES:
             raise LineTrackDesignerError(
                     '{} is not a valid tile value'.format(tile))
-        if not 0 <= orient <= 3:
+        if orient not in VALID_ORIENT:
             raise LineTrackDesignerError(
                     '{} is not a valid orient value'.format(orient))
-        nrow, ncol = self.tiles.shape
-        if row >= nrow:
-            for _ in range(nrow - 1, row):
-                self.add_row()
-        if col >= ncol:
-            for _ in range(ncol - 1, col):
-                self.add_col()
-        self._tiles[row][col] = tile
-        self._orient[row][col] = orient
+        nrow, ncol = self._shape
+        if row >= nrow or col >= ncol:
+            self._resize(max(nrow, row + 1), max(ncol, col + 1))
+            logging.info('Track resized to {} rows and {} columns'.format(
+                *self._shape))
+        self.tiles[row, col] = tile
+        self.orient[row, col] = orient
+        self._mark_dirty((row, col))
         logging.info('Tile ({}, {}) set to track'.format(row, col))
 
+    def set_tiles(self, rows, cols, tiles, orient):
+        """
+        Set several tiles of the track at once. The arguments are
+        broadcast together, so a single tile or orientation can be given
+        for all the cells. The whole batch is validated before any cell
+        is modified, and the track grows if needed.
+
+        For example, to draw a horizontal line on the first row:
+
+        .. code-block:: python
+
+            track.set_tiles(0, range(10), 2, 1)
+
+        Args:
+            rows (array_like): indexes of the rows of the tiles
+            cols (array_like): indexes of the columns of the tiles
+            tiles (array_like): numbers of the tiles
+            orient (array_like): orientations of the tiles
+
+        Raises:
+            LineTrackDesignerError: invalid tile/orient values
+
+        """
+        rows, cols, tiles, orient = np.broadcast_arrays(
+            rows, cols, tiles, orient)
+        _check_values(tiles, orient, rows, cols)
+        if rows.size == 0:
+            return
+        nrow, ncol = self._shape
+        max_row, max_col = rows.max(), cols.max()
+        if max_row >= nrow or max_col >= ncol:
+            self._resize(max(nrow, max_row + 1), max(ncol, max_col + 1))
+            logging.info('Track resized to {} rows and {} columns'.format(
+                *self._shape))
+        self.tiles[rows, cols] = tiles
+        self.orient[rows, cols] = orient
+        self._mark_dirty((rows, cols))
+        logging.info('{} tiles set to track'.format(rows.size))
+
+    def fill(self, seed=None, fewest=False, tiles=None, weights=None,
+             borders=True):
+        """
+        Fill the empty cells of the track (tile 0) so that the line is
+        continuous with the tiles already placed, which are not modified.
+        The same seed always gives the same tiles.
+
+        For example, to complete a design with as few tiles as possible:
+
+        .. code-block:: python
+
+            track.fill(fewest=True)
+
+        Args:
+            seed (int): seed of the random generator (default: None)
+            fewest (bool): use as few tiles with a line as possible
+            tiles (list of int): tiles that can be used (default: all)
+            weights (dict): relative probability of each tile (default: 1)
+            borders (bool): forbid the line to leave the track if True
+
+        Raises:
+            LineTrackDesignerError: unable to fill the track
+
+        """
+        if tiles is None and weights is None:
+            generator = default_generator()
+        else:
+            generator = Generator(tiles, weights)
+        rows, cols, t, o = generator.fill(
+            self.tiles, self.orient, seed, fewest, borders)
+        self.set_tiles(rows, cols, t, o)
+        logging.info('Track filled')
+
+    def update(self, other):
+        """
+        Replace the tiles and orientations of the track by those of
+        another track, for example a new version of its file. The last
+        rendered image is kept, so the next export only renders the cells
+        that differ.
+
+        Args:
+            other (Track): new version of the track
+
+        Returns:
+            int: number of cells modified
+
+        """
+        nrow, ncol = other.tiles.shape
+        old_nrow, old_ncol = self._shape
+        if nrow > old_nrow or ncol > old_ncol:
+            self._resize(max(nrow, old_nrow), max(ncol, old_ncol))
+        if (nrow, ncol) != self._shape:
+            self._shape = (nrow, ncol)
+            if self._render is not None:
+                img, side, dirty = self._render
+                self._render = (img.crop((0, 0, ncol*side, nrow*side)),
+                                side, dirty[:nrow, :ncol].copy())
+        changed = (self.tiles != other.tiles) | (self.orient != other.orient)
+        self.tiles[changed] = other.tiles[changed]
+        self.orient[changed] = other.orient[changed]
+        self._mark_dirty(changed)
+        count = int(np.count_nonzero(changed))
+        logging.info('{} cells updated'.format(count))
+        return count
+
+    def __getitem__(self, key):
+        """
+        Get the tiles and orientations of a cell or a region.
+        For example, ``track[0:2, 1:3]`` returns the arrays of tiles and
+        orientations of this region.
+
+        Args:
+            key: index of the cell or the region (NumPy indexing)
+
+        Returns:
+            tuple: tiles and orientations
+
+        """
+        cells = self.__dict__.get('_cells')
+        if cells is None:
+            return self.tiles[key], self.orient[key]
+        # Only the cells of the region are decoded from the binary file
+        nrow, ncol = self._shape
+        cells = cells[key]
+        tiles, orient = cells >> 2, cells & 3
+        # The errors give the positions of the cells in the track
+        rows, cols = np.broadcast_arrays(*np.ogrid[:nrow, :ncol])
+        _check_values(tiles, orient, *np.atleast_1d(rows[key], cols[key]))
+        return tiles, orient
+
+    def __setitem__(self, key, value):
+        """
+        Set the tiles and orientations of a cell or a region.
+        The region must be inside the track. For example:
+
+        .. code-block:: python
+
+            track[0:2, 1:3] = (tiles, orient)
+            track[1, :] = (2, 1)
+
+        Args:
+            key: index of the cell or the region (NumPy indexing)
+            value (tuple): tiles and orientations (array_like)
+
+        Raises:
+            LineTrackDesignerError: invalid tile/orient values
+
+        """
+        tiles, orient = value
+        shape = self.tiles[key].shape
+        tiles = np.broadcast_to(tiles, shape)
+        orient = np.broadcast_to(orient, shape)
+        _check_values(tiles, orient)
+        self.tiles[key] = tiles
+        self.orient[key] = orient
+        self._mark_dirty(key)
+        logging.info('Region set to track')
+
     def rotate(self, k=1):
         """
         Rotate the track.
@@ -279,13 +850,75 @@ class Track:
             k (int): number of rotations (default: 1)
 
         """
-        nrow, ncol = self.orient.shape
-        shape = (nrow, ncol) if k % 2 == 0 else (ncol, nrow)
-        self._tiles = np.rot90(self.tiles, k)
-        self._orient = np.mod(
-            (np.rot90(self.orient, k) + np.ones(shape, dtype=int) * k), 4)
+        self._set_arrays(
+            np.rot90(self.tiles, k), (np.rot90(self.orient, k) + k % 4) % 4)
+        if self._render is not None and k % 4 != 0:
+            img, side, dirty = self._render
+            self._render = (
+                img.transpose(TileCache.ROTATIONS[k % 4]), side,
+                np.rot90(dirty, k).copy())
         logging.info('Track rotated {} times'.format(k))
 
+    def mirror(self):
+        """
+        Mirror the track: the columns are reversed and each tile is
+        replaced by its mirror image.
+
+        Raises:
+            LineTrackDesignerError: a tile has no mirror image
+
+        """
+        tiles, orient = _mirror_arrays(self.tiles, self.orient)
+        self._set_arrays(tiles, orient)
+        self._mark_dirty(np.s_[:, :])
+        logging.info('Track mirrored')
+
+    def canonical(self, mirror=False):
+        """
+        Return the canonical form of the track: among the 4 rotations of
+        the track (and their mirror images if mirror is True), the one
+        with the smallest arrays. The orientations of the symmetric tiles
+        are normalized, so all the tracks giving the same design have the
+        same canonical form. If a tile has no mirror image, only the
+        rotations are used.
+
+        Args:
+            mirror (bool): use the mirror images too
+
+        Returns:
+            Track: canonical track
+
+        """
+        t, o = self.tiles, self.orient
+        variants = []
+        if mirror and np.all((MIRROR_TILES[t, o] != 0) | (t == 0)):
+            variants.append(_mirror_arrays(t, o))
+        variants.append((t, o))
+        best = None
+        for t, o in variants:
+            for k in range(4):
+                rt = np.rot90(t, k)
+                ro = CANONICAL_ORIENT[rt, (np.rot90(o, k) + k) % 4]
+                key = (rt.shape, rt.tobytes(), ro.tobytes())
+                if best is None or key < best[0]:
+                    best = (key, rt, ro)
+        return Track(best[1], best[2], self.name)
+
+    def canonical_digest(self, mirror=False):
+        """
+        Return the digest of the canonical form of the track: the
+        rotated (and mirrored if mirror is True) tracks have the same
+        canonical digest.
+
+        Args:
+            mirror (bool): use the mirror images too
+
+        Returns:
+            str: SHA-256 hexadecimal digest
+
+        """
+        return self.canonical(mirror).digest()
+
     def dimensions(self):
         """
         Return the dimensions in mm of the track.
@@ -294,78 +927,382 @@ class Track:
             tuple of int: width and height in mm
 
         """
-        nrow, ncol = self.tiles.shape
+        nrow, ncol = self._shape
         return ncol*Tile.SIDE, nrow*Tile.SIDE
 
-    def occurences(self):
+    def connectors(self):
+        """
+        Return the positions in mm of the line on the sides of each cell.
+        The element [i, j, s] is the position on the side s (top, right,
+        bottom, left) of the cell (i, j), or NaN if there is no line.
+
+        Returns:
+            numpy.array: connectors of the cells
+
+        """
+        return CONNECTOR_TABLE[self.tiles, self.orient]
+
+    def validate_connectivity(self, borders=False):
+        """
+        Check that the line is continuous across the borders of the tiles.
+        Each cell is compared with its right and bottom neighbours: a seam
+        is broken if the line reaches only one side of it, or if the
+        positions of the line differ by more than half the line width.
+
+        Args:
+            borders (bool): also report the lines leaving the track if True
+
+        Returns:
+            numpy.array: broken seams, one per row: (row, col) of a cell
+            and (row, col) of its neighbour. The neighbour is outside the
+            track for the borders.
+
+        """
+        if 0 in self._shape:
+            return np.zeros((0, 4), dtype=int)
+        edges = self.connectors()
+        tol = Tile.LINE_WIDTH / 2
+
+        def broken(a, b):
+            na, nb = np.isnan(a), np.isnan(b)
+            return (na != nb) | (np.abs(a - b) > tol)
+
+        seams = []
+        for mask, (di, dj) in [
+                (broken(edges[:, :-1, 1], edges[:, 1:, 3]), (0, 1)),
+                (broken(edges[:-1, :, 2], edges[1:, :, 0]), (1, 0))]:
+            i, j = np.nonzero(mask)
+            seams.append(np.stack([i, j, i + di, j + dj], axis=1))
+        if borders:
+            nrow, ncol = self.tiles.shape
+            for side, (di, dj) in enumerate(
+                    [(-1, 0), (0, 1), (1, 0), (0, -1)]):
+                mask = ~np.isnan(edges[:, :, side])
+                border = np.zeros_like(mask)
+                if side == 0:
+                    border[0] = True
+                elif side == 1:
+                    border[:, -1] = True
+                elif side == 2:
+                    border[-1] = True
+                else:
+                    border[:, 0] = True
+                i, j = np.nonzero(mask & border)
+                seams.append(np.stack([i, j, i + di, j + dj], axis=1))
+        seams = np.concatenate(seams).astype(int)
+        return seams[np.lexsort(seams.T[::-1])]
+
+    def path_graph(self):
+        """
+        Return the graph of the line network of the track. The nodes are
+        the points where the line crosses the borders of the tiles (and
+        the internal points of the tiles), and the edges are the segments
+        of the line inside the tiles.
+
+        Returns:
+            PathGraph: graph of the track
+
+        """
+        return PathGraph.from_arrays(self.tiles, self.orient)
+
+    def path_length(self):
+        """
+        Return the total length of the line of the track in mm.
+        The lengths of the curves are approximate.
+
+        Returns:
+            float: length in mm
+
+        """
+        return self.path_graph().length()
+
+    @staticmethod
+    def batch_occurences(tracks, dense=False):
+        """
+        Return the occurences of the tiles used by several tracks.
+        They are counted in one pass over all the tracks.
+
+        Args:
+            tracks (list of Track): tracks
+            dense (bool): return an array instead of dictionaries if True
+
+        Returns:
+            list of dict or numpy.array: occurences of each track. The
+            array has one row per track, and the column i is the number
+            of occurences of the tile i (the column 0 counts the empty
+            cells).
+
+        """
+        n = _VALID_TILES.size
+        if not tracks:
+            counts = np.zeros((0, n), dtype=int)
+        else:
+            cells = np.concatenate(
+                [t.tiles.ravel().astype(np.intp) + k*n
+                 for k, t in enumerate(tracks)])
+            counts = np.bincount(
+                cells, minlength=n*len(tracks)).reshape(len(tracks), n)
+        if dense:
+            return counts
+        return [Track._occurences_dict(c) for c in counts]
+
+    @staticmethod
+    def _occurences_dict(counts):
+        """Make the dictionary of occurences from the counts."""
+        return {i: int(counts[i]) for i in range(2, counts.size) if counts[i]}
+
+    def occurences(self, dense=False):
         """
         Return the occurences of each tile used by the track.
         It returns a dictionary. The keys corresponds to the number
         of a tile and the values are the number of occurences.
 
+        Args:
+            dense (bool): return an array instead of a dictionary if True.
+                The element i of the array is the number of occurences of
+                the tile i (the element 0 counts the empty cells).
+
         Returns:
-            dict: occurences
+            dict or numpy.array: occurences
 
         """
-        occur = {}
-        for i in range(2, 34):
-            count = np.count_nonzero(self.tiles == i)
-            if count != 0:
-                occur[i] = count
-        return occur
+        counts = np.bincount(self.tiles.ravel(), minlength=_VALID_TILES.size)
+        if dense:
+            return counts
+        return Track._occurences_dict(counts)
 
-    def print_track(self):
+    def print_track(self, printer=None, cache=None):
         """
         Ask the printer to print the tiles to build the track.
+        The pages of the tiles are gathered in a single PDF file
+        (see export_print_pdf), printed by a single job.
+
+        Args:
+            printer (Printer): printer (default: first printer of the
+                shared connection to CUPS)
+            cache (RenderCache): cache of PDF files (default: None)
+
+        Returns:
+            list of int: ids of the jobs
+
         """
+        # The printer module imports cups, only needed to print
+        from line_track_designer.printer import PrintPlan, default_printer
         try:
-            occur = self.occurences()
-            printer = Printer()
+            printer = printer or default_printer()
             logging.info('Printing track')
-            for i in occur:
-                printer.print_page(occur[i], i, self.name)
+            with tempfile.TemporaryDirectory() as tmp:
+                file = os.path.join(tmp, 'track.pdf')
+                self.export_print_pdf(file, cache)
+                return printer.print_plan(
+                    PrintPlan.from_track(self), file=file)
         except Exception:
             raise LineTrackDesignerError('unable to print the track')
 
-    def export_img(self):
+    def export_print_pdf(self, file, cache=None):
         """
-        Export the track to image. It uses the PIL library.
+        Save the pages of the tiles to print to build the track in a PDF
+        file: each tile is repeated as many times as it is used. The
+        pages are copied from the PDF file of the tiles without being
+        rasterized, and their contents are shared by the copies.
+
+        With a cache, the file is copied from the cache if the same
+        track has already been exported.
+
+        Args:
+            file (str): filename
+            cache (RenderCache): cache of PDF files (default: None)
+
+        Raises:
+            LineTrackDesignerError: bad filename extension: use .pdf
+
+        """
+        if Path(file).suffix != '.pdf':
+            raise LineTrackDesignerError('bad filename extension: use .pdf')
+        if cache is not None:
+            key = hashlib.sha256('{}:pdf:{}'.format(
+                self.digest(), RENDER_VERSION).encode()).hexdigest()
+            if cache.get(key, file):
+                logging.info('Track saved as PDF file: {}'.format(file))
+                return
+        reader = _tiles_reader()
+        with PDFWriter(file) as writer:
+            for number, copies in sorted(self.occurences().items()):
+                for _ in range(copies):
+                    writer.add_page(reader, number - 1)
+        if cache is not None:
+            cache.put(key, file)
+        logging.info('Track saved as PDF file: {}'.format(file))
+
+    def tile_side(self, size=1575, dpi=None):
+        """
+        Return the side in pixels of a tile in the image of the track.
+
+        Args:
+            size (int): maximum width and height of the image in pixels
+                (default: 1575). If None, the tiles keep their full
+                resolution.
+            dpi (int): resolution of the image in dots per inch.
+                If set, size is ignored.
 
         Returns:
-            Image: image of the track
+            int: side of a tile in pixels
+
+        Raises:
+            LineTrackDesignerError: invalid size or dpi value
+
+        """
+        if dpi is not None:
+            if dpi <= 0:
+                raise LineTrackDesignerError(
+                        '{} is not a valid dpi value'.format(dpi))
+            return max(1, round(dpi * Tile.SIDE / 25.4))
+        if size is None:
+            return Tile.PIXELS
+        if size <= 0:
+            raise LineTrackDesignerError(
+                    '{} is not a valid size value'.format(size))
+        return max(1, min(Tile.PIXELS, size // max(self._shape + (1,))))
+
+    def _paste(self, img, side, rows, cols, row0=0, cache=None):
+        """
+        Paste the tiles of the cells (rows, cols) on the image. The image
+        of each tile and orientation is got once from the cache, before
+        pasting the cells.
+        """
+        cache = Tiles(cache).cache
+        rows, cols = np.asarray(rows, dtype=int), np.asarray(cols, dtype=int)
+        tiles, orient = self[rows, cols]
+        codes = np.where(tiles == 0, 11, tiles).astype(int)*NB_ORIENT + orient
+        keys, index = np.unique(codes, return_inverse=True)
+        images = [cache.get_image(key // NB_ORIENT, key % NB_ORIENT, side,
+                                  img.mode) for key in keys.tolist()]
+        for i, j, k in zip(rows.tolist(), cols.tolist(), index.tolist()):
+            img.paste(images[k], (j*side, (i - row0)*side))
+
+    def _render_bands(self, side, workers):
+        """
+        Render the track in horizontal bands with a pool of threads.
+        PIL releases the GIL while pasting, so the bands are pasted in
+        parallel on the same image.
+        """
+        nrow, ncol = self.tiles.shape
+        bands = [b for b in np.array_split(np.arange(nrow), workers)
+                 if b.size]
+        # Every cell is pasted, so the image is not initialized
+        track_img = Image.new('RGB', (ncol*side, nrow*side), None)
+
+        def render(band):
+            self._paste(track_img, side, np.repeat(band, ncol),
+                        np.tile(np.arange(ncol), band.size))
+
+        with ThreadPoolExecutor(workers) as executor:
+            list(executor.map(render, bands))
+        return track_img
 
+    def _export(self, side, workers=1, keep=True):
+        """
+        Render the image of the track with tiles of side pixels. The
+        image is the one kept by the track if keep is True, so it must
+        be copied before being given to the caller.
         """
-        SIDE = 1575
-        t = Tiles()
         nrow, ncol = self.tiles.shape
-        track_img = Image.new('RGB', (ncol*SIDE, nrow*SIDE))
-        for i in range(nrow):
-            for j in range(ncol):
-                num_t = self.tiles[i][j]
-                current_tile = t.get_tile(num_t if num_t != 0 else 11)
-                current_orient = self.orient[i][j]
-                track_img.paste(
-                    current_tile.image.rotate(90*current_orient),
-                    (j*SIDE, i*SIDE))
-        track_img.thumbnail((SIDE, SIDE), Image.ANTIALIAS)
+        if self._render is not None and self._render[1] == side:
+            track_img, _, dirty = self._render
+            rows, cols = np.nonzero(dirty)
+            logging.info('{} cells rendered again'.format(rows.size))
+            self._paste(track_img, side, rows, cols)
+        elif workers > 1:
+            track_img = self._render_bands(side, workers)
+        else:
+            track_img = Image.new('RGB', (ncol*side, nrow*side), None)
+            rows, cols = np.indices((nrow, ncol)).reshape(2, -1)
+            self._paste(track_img, side, rows, cols)
+        if keep:
+            self._render = (
+                track_img, side, np.zeros((nrow, ncol), dtype=bool))
+        else:
+            self._render = None
         logging.info('Track exported to image')
         return track_img
 
-    def show(self):
+    def export_img(self, size=1575, dpi=None, workers=1, keep=False):
+        """
+        Export the track to image. It uses the PIL library.
+        The tiles are resized before being pasted, so the image is
+        rendered directly at its output resolution.
+
+        By default, the image is given to the caller without being
+        copied and the track keeps nothing. If keep is True, the track
+        keeps the last rendered image and a copy is returned. If the side
+        of the tiles doesn't change, the next export only renders the
+        cells modified since (by the methods of the track) and shifts
+        the image when rows or columns are added, deleted or rotated.
+        The cells written directly in the tiles and orient arrays are
+        not rendered again.
+
+        Args:
+            size (int): maximum width and height of the image in pixels
+                (default: 1575). If None, the tiles keep their full
+                resolution.
+            dpi (int): resolution of the image in dots per inch.
+                If set, size is ignored.
+            workers (int): number of threads rendering a full image in
+                horizontal bands (default: 1)
+            keep (bool): keep the image for the next exports (default:
+                False)
+
+        Returns:
+            Image: image of the track
+
+        Raises:
+            LineTrackDesignerError: invalid workers value
+
+        """
+        if workers < 1:
+            raise LineTrackDesignerError(
+                    '{} is not a valid workers value'.format(workers))
+        track_img = self._export(self.tile_side(size, dpi), workers, keep)
+        return track_img.copy() if keep else track_img
+
+    def show(self, size=1575, keep=False):
         """
         Displays the track with the PIL library.
         The image is in PNG format.
+
+        Args:
+            size (int): maximum width and height of the image in pixels
+                (default: 1575)
+            keep (bool): keep the image, so the next calls only render
+                the cells modified since (default: False)
+
         """
-        track_img = self.export_img()
+        track_img = self._export(self.tile_side(size), keep=keep)
         track_img.show(title=self.name)
         logging.info('Showing track')
 
-    def save_img(self, file):
+    def save_img(self, file, size=1575, dpi=None, streaming=False,
+                 cache=None):
         """
         Save the track as an image.
 
+        With streaming, the image is rendered and written one row of
+        tiles at a time, so the whole image is never stored in memory,
+        and the bitmaps of the tiles are not kept after the export.
+        It is useful to export large tracks at full resolution.
+
+        With a render cache, the image is copied from the cache if the
+        same track has already been saved with the same parameters.
+
         Args:
             file (str): filename
+            size (int): maximum width and height of the image in pixels
+                (default: 1575). If None, the tiles keep their full
+                resolution.
+            dpi (int): resolution of the image in dots per inch.
+                If set, size is ignored.
+            streaming (bool): write the image band by band if True
+            cache (RenderCache): cache of rendered images (default: None)
 
         Raises:
             LineTrackDesignerError: bad filename extension: use .png
@@ -374,10 +1311,45 @@ class Track:
         p = Path(file)
         if p.suffix != '.png':
             raise LineTrackDesignerError('bad filename extension: use .png')
-        track_img = self.export_img()
-        track_img.save(file)
+        if cache is not None:
+            key = hashlib.sha256('{}:png:{}:{}:{}'.format(
+                self.digest(), self.tile_side(size, dpi), dpi,
+                RENDER_VERSION).encode()).hexdigest()
+            if cache.get(key, file):
+                logging.info('Track saved as PNG file: {}'.format(file))
+                return
+        if streaming:
+            self._save_img_streaming(file, size, dpi)
+        else:
+            # The image is kept only if the track was already rendered
+            track_img = self._export(
+                self.tile_side(size, dpi), keep=self._render is not None)
+            if dpi is not None:
+                track_img.save(file, dpi=(dpi, dpi))
+            else:
+                track_img.save(file)
+        if cache is not None:
+            cache.put(key, file)
         logging.info('Track saved as PNG file: {}'.format(file))
 
+    def _save_img_streaming(self, file, size, dpi):
+        # The tiles come from a small private cache, so the full size
+        # bitmaps are not kept by the process-wide cache after the export.
+        # Each bitmap is got once per row, even if the cache is full.
+        cache = TileCache(maxbytes=64 << 20)
+        side = self.tile_side(size, dpi)
+        nrow, ncol = self._shape
+        rows = max(1, (1 << 22) // max(1, 3*ncol*side))
+        # Every cell is pasted, so the same band is used for all the rows
+        band = Image.new('RGB', (ncol*side, side), None)
+        with PNGWriter(file, ncol*side, nrow*side, 'RGB', dpi) as w:
+            for i in range(nrow):
+                self._paste(band, side, np.full(ncol, i), np.arange(ncol),
+                            i, cache)
+                # The band is written by blocks of rows to avoid copying it
+                for y in range(0, side, rows):
+                    w.write(band.crop((0, y, ncol*side, min(side, y + rows))))
+
     def save_txt(self, file):
         """
         Save the track as a text file. The content of the text
@@ -398,7 +1370,59 @@ class Track:
         f.close()
         logging.info('Track saved: {}'.format(file))
 
-    def save_md(self, file, description=''):
+    def save_bin(self, file):
+        """
+        Save the track as a binary file. The file contains a small header
+        (version, shape and name) followed by one byte per cell, where
+        the tile number and the orientation are packed together.
+
+        Args:
+            file (str): filename
+
+        Raises:
+            LineTrackDesignerError: bad filename extension: use .trk
+            LineTrackDesignerError: name too long (more than 65535 bytes)
+
+        """
+        p = Path(file)
+        if p.suffix != '.trk':
+            raise LineTrackDesignerError('bad filename extension: use .trk')
+        name = self.name.encode()
+        if len(name) > 0xffff:
+            raise LineTrackDesignerError(
+                    'name too long for the binary format: {} bytes'.format(
+                        len(name)))
+        nrow, ncol = self.tiles.shape
+        cells = (self.tiles.astype(np.uint8) << 2) | self.orient.astype(
+            np.uint8)
+        with open(file, 'wb') as f:
+            f.write(_BIN_HEADER.pack(
+                _BIN_MAGIC, _BIN_VERSION, 0, len(name), nrow, ncol))
+            f.write(name)
+            f.write(np.ascontiguousarray(cells).tobytes())
+        logging.info('Track saved: {}'.format(file))
+
+    def save(self, file):
+        """
+        Save the track in the format given by the extension of the file:
+        text format (.txt) or binary format (.trk).
+
+        Args:
+            file (str): filename
+
+        Raises:
+            LineTrackDesignerError: bad filename extension: use .txt or .trk
+
+        """
+        if Path(file).suffix == '.trk':
+            self.save_bin(file)
+        elif Path(file).suffix == '.txt':
+            self.save_txt(file)
+        else:
+            raise LineTrackDesignerError(
+                    'bad filename extension: use .txt or .trk')
+
+    def save_md(self, file, description='', cache=None, image=True):
         """
         Save the track as a markdown file. It also creates the PNG image
         associated to the track. The md file contains the following
@@ -413,6 +1437,9 @@ class Track:
         Args:
             file (str): filename (markdown file)
             description (str): description of the track
+            cache (RenderCache): cache of rendered images (default: None)
+            image (bool): save the PNG image (default: True). Set it to
+                False if the image is already saved next to the md file.
 
         Raises:
             LineTrackDesignerError: bad extension file: use .md
@@ -424,7 +1451,8 @@ class Track:
         with Markdown(file) as m:
             m.add_title(self.name, 1)
             img = p.with_suffix('.png')
-            self.save_img(img)
+            if image:
+                self.save_img(img, cache=cache)
             m.add_image(img.name, self.name)
             if description != '':
                 m.add_title('description', 2)
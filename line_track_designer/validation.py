@@ -0,0 +1,36 @@
+"""
+The **validation** module gathers the rules of the values of the cells
+of a track and the messages of the errors. It doesn't use NumPy, so the
+**track** module and the pure Python **textformat** module check the
+cells with the same rules and report them with the same messages.
+
+"""
+# Number of tile numbers (the tiles are numbered from 2 to 33)
+NB_TILES = 34
+
+# Number of orientations of a tile
+NB_ORIENT = 4
+
+# Valid values of a cell (0 is an empty cell). The tiles 10 and 32 can
+# not be used.
+VALID_TILES = frozenset(
+    [0] + [i for i in range(2, NB_TILES) if i not in [10, 32]])
+
+# Valid orientations of a cell
+VALID_ORIENT = frozenset(range(NB_ORIENT))
+
+
+def invalid_values(label, cells):
+    """
+    Make the error message listing the invalid values of the cells.
+
+    Args:
+        label (str): kind of value ('tile' or 'orient')
+        cells (list of tuple): value, row and column of each cell
+
+    Returns:
+        str: error message
+
+    """
+    return 'invalid {} values: {}'.format(label, ', '.join(
+        '{} at ({}, {})'.format(*cell) for cell in cells))
@@ -0,0 +1,163 @@
+"""
+The **watch** module keeps the PNG image of a track up to date while the
+track file is edited.
+
+The file is polled: when its modification time, size or inode change,
+the track is read again and compared with the previous version. The image
+is kept in memory between the changes, so only the modified cells are
+rendered again. The tiles have a fixed resolution, so adding rows or
+columns doesn't render the whole track again.
+
+"""
+import os
+import time
+import logging
+from pathlib import Path
+from line_track_designer.track import Track
+from line_track_designer.atomic import atomic_write
+from line_track_designer.error import LineTrackDesignerError
+
+
+class Watcher:
+    """
+    Watch a track file and update its PNG image. A Watcher object is
+    composed of three fields:
+
+    * **filename** (Path): track file
+    * **output** (Path): PNG file
+    * **dpi** (int): resolution of the image in dots per inch
+
+    For example, to update ``track.png`` each time ``track.txt`` is saved:
+
+    .. code-block:: python
+
+        Watcher('track.txt').watch()
+
+    """
+    def __init__(self, filename, output=None, dpi=20):
+        """
+        Init a watcher. The track is read and rendered by the first call
+        to update.
+
+        Args:
+            filename (str): track file
+            output (str): PNG file (default: track file with the .png
+                extension)
+            dpi (int): resolution of the image in dots per inch
+                (default: 20, 157 pixels per tile)
+
+        Raises:
+            LineTrackDesignerError: bad filename extension: use .png
+            LineTrackDesignerError: invalid dpi value
+
+        """
+        self._filename = Path(filename)
+        self._output = Path(output) if output else \
+            self._filename.with_suffix('.png')
+        if self._output.suffix != '.png':
+            raise LineTrackDesignerError('bad filename extension: use .png')
+        if dpi <= 0:
+            raise LineTrackDesignerError(
+                    '{} is not a valid dpi value'.format(dpi))
+        self._dpi = dpi
+        self._track = None
+        self._stat = None
+
+    @property
+    def filename(self):
+        """Get the track file."""
+        return self._filename
+
+    @property
+    def output(self):
+        """Get the PNG file."""
+        return self._output
+
+    @property
+    def dpi(self):
+        """Get the resolution of the image in dots per inch."""
+        return self._dpi
+
+    @property
+    def track(self):
+        """Get the last version of the track (None before update)."""
+        return self._track
+
+    def _signature(self):
+        try:
+            st = os.stat(self._filename)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def changed(self):
+        """
+        Return True if the track file changed since the last update.
+
+        Returns:
+            bool: True if the file changed
+
+        """
+        return self._signature() != self._stat
+
+    def update(self):
+        """
+        Read the track file and update the PNG file. Only the cells that
+        changed since the last update are rendered, and the PNG file is
+        not written if no cell changed. The PNG file is replaced
+        atomically, so a viewer never reads a partial file. The state of
+        the file is recorded even if it is invalid, so changed returns
+        False until it is modified again.
+
+        Returns:
+            int: number of cells modified (all of them the first time)
+
+        Raises:
+            LineTrackDesignerError: invalid track file (the previous
+                version is kept)
+
+        """
+        self._stat = self._signature()
+        new = Track.read(str(self._filename), self._filename.stem)
+        if self._track is None:
+            self._track = new
+            count = new.tiles.size
+        else:
+            shape = self._track.tiles.shape
+            count = self._track.update(new)
+            if count == 0 and shape == new.tiles.shape:
+                return 0
+        # The image kept by the track is saved without being copied
+        img = self._track._export(
+            self._track.tile_side(dpi=self._dpi), keep=True)
+        atomic_write(self._output,
+                     lambda tmp: img.save(tmp, compress_level=1))
+        logging.info('{} cells updated in {}'.format(count, self._output))
+        return count
+
+    def watch(self, interval=0.5, callback=None, stop=None):
+        """
+        Update the PNG file each time the track file changes, until stop
+        returns True (or forever). The errors of the track file (for
+        example while it is being saved) are reported once to the
+        callback, and the previous image is kept until the file changes
+        again.
+
+        Args:
+            interval (float): time in seconds between two checks
+            callback (function): called after each update with the number
+                of cells modified, or the error
+            stop (function): called before each check, stop watching if
+                it returns True
+
+        """
+        while stop is None or not stop():
+            # An invalid file is read again only when it changes
+            if self.changed():
+                try:
+                    result = self.update()
+                except LineTrackDesignerError as e:
+                    result = e
+                if callback is not None:
+                    callback(result)
+            time.sleep(interval)
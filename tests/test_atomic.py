@@ -0,0 +1,41 @@
+import os
+import pytest
+from line_track_designer.atomic import atomic_write
+
+
+def test_atomic_write(tmp_path):
+    file = tmp_path / 'track.txt'
+
+    def write(text):
+        def f(tmp):
+            assert tmp.endswith('.txt')
+            with open(tmp, 'w') as t:
+                t.write(text)
+        return f
+
+    atomic_write(file, write('3;1'))
+    umask = os.umask(0)
+    os.umask(umask)
+    assert file.read_text() == '3;1'
+    assert file.stat().st_mode & 0o777 == 0o666 & ~umask
+    # The mode of an existing file is kept
+    os.chmod(file, 0o640)
+    atomic_write(file, write('2;0'))
+    assert file.read_text() == '2;0'
+    assert file.stat().st_mode & 0o777 == 0o640
+
+
+def test_atomic_write_error(tmp_path):
+    # The file is unchanged and the temporary file is removed
+    file = tmp_path / 'track.txt'
+    file.write_text('3;1')
+
+    def write(tmp):
+        with open(tmp, 'w') as t:
+            t.write('2;0')
+        raise ValueError('write failed')
+
+    with pytest.raises(ValueError):
+        atomic_write(file, write)
+    assert file.read_text() == '3;1'
+    assert os.listdir(tmp_path) == ['track.txt']
@@ -0,0 +1,49 @@
+import os
+import pytest
+from line_track_designer import track as track_module
+from line_track_designer.cache import RenderCache
+from line_track_designer.track import Track
+
+
+path = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_render_cache(tmp_path, monkeypatch):
+    cache = RenderCache(tmp_path / 'cache')
+    track = Track.read(os.path.join(path, 'track.txt'))
+    file = str(tmp_path / 'track.png')
+    track.save_img(file, cache=cache)
+    assert len(os.listdir(cache.directory)) == 1
+    with open(file, 'rb') as f:
+        data = f.read()
+    os.remove(file)
+
+    # The image is copied from the cache, the track is not rendered
+    def export(*args, **kwargs):
+        raise AssertionError('track rendered')
+
+    monkeypatch.setattr(Track, '_export', export)
+    track.save_img(file, cache=cache)
+    with open(file, 'rb') as f:
+        assert f.read() == data
+    # The images of another version of the rendering are not used
+    monkeypatch.setattr(track_module, 'RENDER_VERSION',
+                        track_module.RENDER_VERSION + 1)
+    with pytest.raises(AssertionError):
+        track.save_img(file, cache=cache)
+    monkeypatch.undo()
+    cache.clear()
+    assert cache.size() == 0
+
+
+def test_render_cache_eviction(tmp_path):
+    cache = RenderCache(tmp_path / 'cache', maxsize=10)
+    for i in range(3):
+        file = tmp_path / '{}.txt'.format(i)
+        file.write_text('abcd')
+        os.utime(file)
+        cache.put(str(i), str(file))
+        os.utime(cache.directory / '{}.txt'.format(i), (i, i))
+    assert cache.size() == 8
+    assert cache.get('2', str(tmp_path / 'out.txt'))
+    assert not cache.get('0', str(tmp_path / 'out.txt'))
@@ -1,11 +1,22 @@
 import os
+import subprocess
+import sys
+import pytest
 from click.testing import CliRunner
 from line_track_designer.cli import linetrack
+from line_track_designer.track import Track
 
 
 path = os.path.dirname(os.path.abspath(__file__))
 
 
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    # The commands must not write in the render cache of the user
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    return tmp_path / 'cache'
+
+
 def test_show():
     runner = CliRunner()
     result = runner.invoke(
@@ -20,11 +31,12 @@ def test_write():
     assert result.exit_code == 0
 
 
-def test_savepng():
+def test_savepng(cache_home):
     runner = CliRunner()
     result = runner.invoke(
         linetrack, ['savepng', os.path.join(path, 'track.txt')])
     assert result.exit_code == 0
+    assert any((cache_home / 'line-track-designer').iterdir())
 
 
 def test_savemd():
@@ -39,3 +51,166 @@ def test_rotate():
     result = runner.invoke(
         linetrack, ['rotate', os.path.join(path, 'track.txt'), '-n', 4])
     assert result.exit_code == 0
+
+
+def test_savepng_full_resolution(tmp_path):
+    runner = CliRunner()
+    result = runner.invoke(
+        linetrack, ['savepng', os.path.join(path, 'track.txt'),
+                    '-o', str(tmp_path / 'track.png'), '-f'])
+    assert result.exit_code == 0
+
+
+def test_binary(tmp_path):
+    runner = CliRunner()
+    filename = str(tmp_path / 'track.trk')
+    result = runner.invoke(linetrack, ['create', filename, '2', '3'])
+    assert result.exit_code == 0
+    result = runner.invoke(linetrack, ['addcol', filename])
+    assert result.exit_code == 0
+    result = runner.invoke(linetrack, ['write', filename])
+    assert result.output == '0;0 0;0 0;0 0;0\n0;0 0;0 0;0 0;0\n'
+
+
+def test_batch(tmp_path):
+    runner = CliRunner()
+    bad = tmp_path / 'bad.txt'
+    bad.write_text('3;1 2;x')
+    result = runner.invoke(
+        linetrack, ['batch', os.path.join(path, 'track_hard.txt'), str(bad),
+                    '-f', 'png', '-f', 'trk', '-o', str(tmp_path / 'out'),
+                    '-j', 2, '--no-cache'])
+    assert result.exit_code == 1
+    assert (tmp_path / 'out' / 'track_hard.png').is_file()
+    assert (tmp_path / 'out' / 'track_hard.trk').is_file()
+    assert 'bad.txt: failed' in result.output
+
+
+def test_batch_same_format(tmp_path):
+    # The track files must not be exported over themselves
+    runner = CliRunner()
+    track = tmp_path / 'track.txt'
+    track.write_text('3;1 2;1\n2;0 11;0')
+    mtime = track.stat().st_mtime_ns
+    result = runner.invoke(
+        linetrack, ['batch', str(tmp_path), '-f', 'txt', '-f', 'trk',
+                    '--no-cache'])
+    assert result.exit_code == 0
+    assert track.stat().st_mtime_ns == mtime
+    assert (tmp_path / 'track.trk').is_file()
+    assert result.output == '{}: {}\n'.format(track, tmp_path / 'track.trk')
+
+
+def test_batch_collisions(tmp_path):
+    # The tracks are not exported over the files of the other tracks
+    runner = CliRunner()
+    for d in ['a', 'b']:
+        (tmp_path / d).mkdir()
+        (tmp_path / d / 'track.txt').write_text('3;1 2;1\n2;0 11;0')
+    out = tmp_path / 'out'
+    result = runner.invoke(
+        linetrack, ['batch', str(tmp_path / 'a'), str(tmp_path / 'b'),
+                    '-f', 'png', '-o', str(out), '--no-cache'])
+    assert result.exit_code == 1
+    assert '{}: failed: {} is also exported from {}'.format(
+        tmp_path / 'b' / 'track.txt', (out / 'track.png').resolve(),
+        tmp_path / 'a' / 'track.txt') in result.output
+    track = tmp_path / 'a' / 'track.txt'
+    Track.read(str(track)).save(str(track.with_suffix('.trk')))
+    mtime = track.stat().st_mtime_ns
+    result = runner.invoke(
+        linetrack, ['batch', str(tmp_path / 'a'), '-f', 'txt',
+                    '--no-cache'])
+    assert result.exit_code == 1
+    assert '{}: failed: would overwrite the track file {}'.format(
+        track.with_suffix('.trk'), track.resolve()) in result.output
+    assert track.stat().st_mtime_ns == mtime
+
+
+def test_batch_md(tmp_path, monkeypatch):
+    # The PNG image is rendered once for the png and md formats
+    runner = CliRunner()
+    calls = []
+    export = Track._export
+
+    def count(self, *args, **kwargs):
+        calls.append(args)
+        return export(self, *args, **kwargs)
+
+    monkeypatch.setattr(Track, '_export', count)
+    result = runner.invoke(
+        linetrack, ['batch', os.path.join(path, 'track.txt'), '-f', 'md',
+                    '-f', 'png', '-o', str(tmp_path), '-j', 1,
+                    '--no-cache'])
+    assert result.exit_code == 0
+    assert len(calls) == 1
+    assert result.output == '{}: {}, {}\n'.format(
+        os.path.join(path, 'track.txt'), tmp_path / 'track.png',
+        tmp_path / 'track.md')
+
+
+def test_duplicates():
+    runner = CliRunner()
+    result = runner.invoke(
+        linetrack, ['duplicates', path, '--mirror', '-t', 0.5])
+    assert result.exit_code == 0
+    assert 'track_rotate_1.txt' in result.output
+
+
+def test_duplicates_errors(tmp_path):
+    runner = CliRunner()
+    (tmp_path / 'bad.txt').write_text('3;1 2;x')
+    for name in ['a.txt', 'b.txt']:
+        (tmp_path / name).write_text('3;1 2;1')
+    result = runner.invoke(linetrack, ['duplicates', str(tmp_path)])
+    assert result.exit_code == 1
+    assert 'bad.txt: failed' in result.output
+    assert '{} = {}'.format(tmp_path / 'a.txt', tmp_path / 'b.txt') in \
+        result.output
+
+
+def test_startup():
+    # Writing a text track must not import NumPy, Pillow or CUPS
+    code = ('from line_track_designer.cli import linetrack; '
+            'linetrack(["write", {!r}], standalone_mode=False)').format(
+                os.path.join(path, 'track.txt'))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, check=True)
+    modules = {line.split('|')[-1].strip()
+               for line in result.stderr.splitlines()
+               if line.startswith('import time:')}
+    assert 'line_track_designer.cli' in modules
+    for module in ['numpy', 'PIL', 'cups', 'line_track_designer.track']:
+        assert module not in modules
+    assert result.stdout.startswith('3;1 2;1 3;0')
+
+
+def test_apply(tmp_path):
+    runner = CliRunner()
+    file = tmp_path / 'track.txt'
+    file.write_text('3;1 2;1\n2;0 11;0')
+    script = tmp_path / 'ops.txt'
+    script.write_text('# Close the track\naddrow\nset 2 0 3;2\nset 2 1 2 1\n')
+    result = runner.invoke(
+        linetrack, ['apply', str(file), 'addcol', 'set 0 2 3 0',
+                    '-s', str(script)])
+    assert result.exit_code == 0
+    assert file.read_text() == '3;1 2;1 3;0\n2;0 11;0 0;0\n3;2 2;1 0;0'
+    result = runner.invoke(
+        linetrack, ['apply', str(file)], input='delcol -1\nrotate 2\n')
+    assert result.exit_code == 0
+    assert file.read_text() == '2;3 3;0\n11;2 2;2\n2;3 3;3'
+    before = file.read_text()
+    result = runner.invoke(
+        linetrack, ['apply', str(file), 'addcol', 'set 0 0 40 0'])
+    assert result.exit_code == 1
+    assert 'invalid tile values' in result.output
+    assert file.read_text() == before
+    assert sorted(os.listdir(tmp_path)) == ['ops.txt', 'track.txt']
+    # The mode of the track file is kept
+    for mode in [0o644, 0o600]:
+        file.chmod(mode)
+        result = runner.invoke(linetrack, ['apply', str(file), 'rotate'])
+        assert result.exit_code == 0
+        assert file.stat().st_mode & 0o777 == mode
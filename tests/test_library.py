@@ -0,0 +1,59 @@
+import os
+import pytest
+from line_track_designer.track import Track
+from line_track_designer.library import TrackIndex, histogram, blocks
+from line_track_designer.error import LineTrackDesignerError
+
+
+path = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_sketches():
+    track = Track.read(os.path.join(path, 'track.txt'))
+    rotated = Track.read(os.path.join(path, 'track_rotate_1.txt'))
+    assert (histogram(track) == histogram(rotated)).all()
+    assert (blocks(track) == blocks(rotated)).all()
+    assert histogram(track).sum() == track.tiles.size
+
+
+def test_index():
+    index = TrackIndex.from_paths([path])
+    assert len(index) == 4
+    assert os.path.join(path, 'track.txt') in index
+    assert sorted(index.duplicates()[0]) == [
+        os.path.join(path, name) for name in
+        ['track.txt', 'track_rotate_1.txt', 'track_rotate_2.txt']]
+    track = Track.read(os.path.join(path, 'track_hard.txt'))
+    assert index.find(track) == [os.path.join(path, 'track_hard.txt')]
+    with pytest.raises(LineTrackDesignerError):
+        index.add(track, os.path.join(path, 'track_hard.txt'))
+    with pytest.raises(LineTrackDesignerError):
+        TrackIndex(hashes=10, bands=3)
+
+
+def test_index_errors(tmp_path):
+    # A file that can not be read doesn't stop the indexing
+    (tmp_path / 'bad.txt').write_text('3;1 2;x')
+    (tmp_path / 'track.txt').write_text('3;1 2;1')
+    errors = []
+    index = TrackIndex.from_paths([tmp_path], errors=errors)
+    assert len(index) == 1 and str(tmp_path / 'track.txt') in index
+    assert errors == [(str(tmp_path / 'bad.txt'),
+                       "line 1, column 5: invalid cell '2;x'")]
+
+
+def test_similar():
+    index = TrackIndex(mirror=True)
+    tracks = [Track.generate(10, 10, seed=seed, tiles=[2, 3, 4, 9, 12])
+              for seed in range(20)]
+    for seed, track in enumerate(tracks):
+        index.add(track, str(seed))
+    track = tracks[3].canonical()
+    track.mirror()
+    track.rotate()
+    assert index.find(track) == ['3']
+    track[4:6, 4:6] = (11, 0)
+    assert index.find(track) == []
+    assert index.similar(track, 0.6)[0][0] == '3'
+    index.add(track, 'edited')
+    assert ('3', 'edited') in [p[:2] for p in index.near_duplicates(0.6)]
@@ -0,0 +1,58 @@
+import os
+import pytest
+from line_track_designer.track import Track
+from line_track_designer.printer import Printer, PrintPlan, page_ranges
+from line_track_designer.error import LineTrackDesignerError
+
+
+path = os.path.dirname(os.path.abspath(__file__))
+
+
+class FakeConnection:
+    """Record the jobs instead of printing them."""
+    def __init__(self, printers=('fake',)):
+        self.printers = {name: {} for name in printers}
+        self.jobs = []
+
+    def getPrinters(self):
+        return self.printers
+
+    def printFile(self, printer, filename, title, options):
+        self.jobs.append((printer, filename, title, options))
+        return len(self.jobs)
+
+
+def test_page_ranges():
+    assert page_ranges([8, 2, 4, 3, 3]) == '2-4,8'
+    assert page_ranges([5]) == '5'
+    assert page_ranges([]) == ''
+
+
+def test_print_plan():
+    plan = PrintPlan({2: 3, 3: 1, 4: 3, 9: 0, 12: 1})
+    assert plan.copies == {2: 3, 3: 1, 4: 3, 12: 1}
+    assert plan.jobs() == [('3,12', 1), ('2,4', 3)]
+
+
+def test_print_track():
+    conn = FakeConnection()
+    printer = Printer(conn)
+    assert printer.printer_name == 'fake'
+    track = Track.read(os.path.join(path, 'track.txt'))
+    occur = track.occurences()
+    printer.print_plan(PrintPlan(occur))
+    assert len(conn.jobs) == len(set(occur.values()))
+    printed = {}
+    for name, filename, title, options in conn.jobs:
+        assert filename == printer.file_tiles
+        for r in options['page-ranges'].split(','):
+            a, _, b = r.partition('-')
+            for page in range(int(a), int(b or a) + 1):
+                printed[page] = int(options['copies'])
+    assert printed == occur
+    conn.jobs.clear()
+    assert track.print_track(printer) == [1]
+    assert conn.jobs[0][1].endswith('.pdf')
+    assert 'page-ranges' not in conn.jobs[0][3]
+    with pytest.raises(LineTrackDesignerError):
+        Printer(FakeConnection(printers=()))
@@ -0,0 +1,26 @@
+import pytest
+from line_track_designer import script
+from line_track_designer.track import Track
+from line_track_designer.error import LineTrackDesignerError
+
+
+def test_parse():
+    ops = script.parse(['addcol', '', '# comment', 'set 0 1 2;3  # cell',
+                        'ROTATE', 'rotate 3'])
+    assert ops == [('addcol', []), ('set', [0, 1, 2, 3]), ('rotate', []),
+                   ('rotate', [3])]
+    for line in ['fill', 'delcol', 'set 0 1 2', 'delrow x', 'mirror 2']:
+        with pytest.raises(LineTrackDesignerError):
+            script.parse([line])
+
+
+def test_apply():
+    track = Track.from_string('3;1 2;1\n2;0 11;0')
+    script.apply(track, script.parse(
+        ['set 0 0 2 1', 'set 3 3 8 0', 'delrow 1', 'mirror']))
+    assert track.tiles.shape == (3, 4)
+    assert track[0, 3] == (2, 3)
+    assert track[2, 0] == (8, 0)
+    for line in ['delcol 10', 'set -1 0 2 0', 'set 0 0 10 0']:
+        with pytest.raises(LineTrackDesignerError):
+            script.apply(track, script.parse([line]))
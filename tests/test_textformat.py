@@ -0,0 +1,44 @@
+import os
+import pytest
+from line_track_designer import textformat
+from line_track_designer.track import Track
+from line_track_designer.error import LineTrackDesignerError
+
+
+path = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_read_write(tmp_path):
+    for name in ['track.txt', 'track_hard.txt']:
+        file = os.path.join(path, name)
+        rows = textformat.read(file)
+        assert textformat.to_string(rows) == str(Track.read(file))
+        textformat.write(tmp_path / name, rows)
+        assert Track.read(str(tmp_path / name)) == Track.read(file)
+
+
+def test_edit():
+    rows = textformat.from_string('3;1 2;1\n2;0 11;0\n')
+    track = Track.from_string('3;1 2;1\n2;0 11;0\n')
+    textformat.add_col(rows)
+    track.add_col()
+    textformat.add_row(rows)
+    track.add_row()
+    textformat.del_col(rows, 0)
+    track.del_col(0)
+    textformat.del_row(rows, -1)
+    track.del_row(-1)
+    assert textformat.to_string(rows) == str(track)
+    assert textformat.to_string(textformat.zeros(2, 3)) == \
+        str(Track.zeros(2, 3))
+    with pytest.raises(IndexError):
+        textformat.del_col(rows, 5)
+
+
+def test_errors():
+    for text in ['3;1 2;x', '3;1 2;1\n2;0', '3;1 40;0', '3;1 2;7']:
+        with pytest.raises(LineTrackDesignerError) as light:
+            textformat.from_string(text)
+        with pytest.raises(LineTrackDesignerError) as full:
+            Track.from_string(text)
+        assert str(light.value) == str(full.value)
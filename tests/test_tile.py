@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from line_track_designer.tile import (
+    Tile, Tiles, TileCache, CONNECTORS, CONNECTOR_TABLE)
+from line_track_designer.error import LineTrackDesignerError
+import pytest
+
+
+def test_tile_cache():
+    cache = TileCache()
+    assert len(cache) == 0
+    tile = cache.get_tile(3)
+    assert tile.number == 3
+    assert cache.get_tile(3) is tile
+    assert 3 in cache and 4 not in cache
+    cache.clear()
+    assert len(cache) == 0
+    with pytest.raises(LineTrackDesignerError):
+        cache.get_tile(10)
+
+
+def test_tile_cache_maxsize():
+    cache = TileCache(maxsize=2)
+    cache.get_tile(2)
+    cache.get_tile(3)
+    cache.get_tile(2)
+    cache.get_tile(4)
+    assert 2 in cache and 4 in cache and 3 not in cache
+    cache.maxsize = 1
+    assert len(cache) == 1 and 4 in cache
+    with pytest.raises(LineTrackDesignerError):
+        cache.maxsize = 0
+
+
+def test_tiles():
+    cache = TileCache()
+    t = Tiles(cache)
+    assert t.get_tile(11).image.size == (1575, 1575)
+    assert len(cache) == 1
+    assert sorted(t.dict_tiles) == [
+        i for i in range(2, 34) if Tile.is_valid(i)]
+
+
+def test_tile_cache_variants():
+    cache = TileCache(maxvariants=3)
+    tile = cache.get_tile(3)
+    img = cache.get_image(3, 1)
+    assert cache.get_image(3, 1) is img
+    assert img.tobytes() == tile.image.rotate(90).tobytes()
+    small = cache.get_image(3, 2, 100)
+    assert small.size == (100, 100)
+    assert cache.nb_variants == 3
+    cache.get_image(3, 1)
+    cache.get_image(4, 0)
+    assert cache.nb_variants == 3
+    assert cache.get_image(3, 1) is img
+    with pytest.raises(LineTrackDesignerError):
+        cache.get_image(3, 4)
+
+
+def test_tile_cache_maxbytes():
+    # Only the variants in the requested mode are kept, within the budget
+    cache = TileCache(maxbytes=100*100*3*2)
+    cache.get_image(3, 0, 100, 'RGB')
+    assert cache.nb_variants == 1 and cache.nbytes == 100*100*3
+    cache.get_image(3, 1, 100, 'RGB')
+    cache.get_image(4, 1, 100, 'RGB')
+    assert cache.nb_variants == 2 and cache.nbytes <= cache.maxbytes
+    cache.get_image(5, 1)
+    assert cache.nb_variants == 2
+    cache.maxbytes = 100*100*3
+    assert cache.nb_variants == 1
+    cache.clear()
+    assert cache.nbytes == 0
+
+
+def test_tile_cache_threads():
+    # The threads asking for the same image wait for the first one
+    cache = TileCache()
+    with ThreadPoolExecutor(4) as executor:
+        images = list(executor.map(
+            lambda _: cache.get_image(3, 1, 100, 'RGB'), range(8)))
+    assert all(img is images[0] for img in images)
+    assert cache.nb_variants == 2
+
+
+def test_connectors():
+    # Compare the connectors with the borders of the rotated images
+    cache = TileCache()
+    side = 315
+    for number in CONNECTORS:
+        for orient in range(4):
+            img = np.asarray(cache.get_image(number, orient, side, 'L'))
+            borders = [img[5], img[:, -6], img[-6], img[:, 5]]
+            expected = Tile(number).connectors(orient)
+            for border, pos in zip(borders, expected):
+                dark = np.nonzero(border < 100)[0]
+                dark = dark[(dark > side // 4) & (dark < 3 * side // 4)]
+                if pos is None:
+                    assert dark.size == 0
+                else:
+                    center = dark.mean() * Tile.SIDE / side
+                    assert abs(center - pos) < 3
+            np.testing.assert_array_equal(
+                CONNECTOR_TABLE[number, orient],
+                np.array(expected, dtype=float))
+
+
+def test_segments():
+    # The segments must reach the sides given by the connectors
+    for number in CONNECTORS:
+        for orient in range(4):
+            tile = Tile(number)
+            sides = {end for a, b, _ in tile.segments(orient)
+                     for end in (a, b) if not isinstance(end, str)}
+            connectors = tile.connectors(orient)
+            assert sides == {s for s in range(4) if connectors[s] is not None}
@@ -1,6 +1,13 @@
+import io
 import os
 import numpy as np
+from PIL import Image
+from line_track_designer import textformat
 from line_track_designer.track import Track
+from line_track_designer.tile import tile_cache
+from line_track_designer.cache import RenderCache
+from line_track_designer.pdfwriter import PDFReader
+from line_track_designer.error import LineTrackDesignerError
 import pytest
 
 
@@ -117,3 +124,407 @@ def test_dimensions(track, track_hard):
     # Test dimensions
     assert track.dimensions() == (600, 600)
     assert track_hard.dimensions() == (600, 1000)
+
+
+def test_export_img(track, track_hard):
+    # Test image size
+    assert track.export_img().size == (1575, 1575)
+    assert track.export_img(300).size == (300, 300)
+    assert track_hard.export_img().size == (945, 1575)
+    assert track.export_img(dpi=10).size == (237, 237)
+
+
+def test_save_img_streaming(track_hard, tmp_path):
+    # Test streaming export
+    for size in [None, 300]:
+        file = str(tmp_path / 'track.png')
+        track_hard.save_img(file, size, streaming=True)
+        with Image.open(file) as img:
+            assert img.tobytes() == track_hard.export_img(size).tobytes()
+
+
+def test_save_img_streaming_memory(track_hard, tmp_path):
+    # Test that the full size bitmaps are not kept after the export
+    tile_cache.clear()
+    track_hard.save_img(str(tmp_path / 'track.png'), None, streaming=True)
+    assert len(tile_cache) == 0 and tile_cache.nbytes == 0
+
+
+def test_invalid_values():
+    # Test that all the invalid cells are reported
+    tiles = np.array([[3, 10], [40, 2]])
+    orient = np.zeros((2, 2), dtype=int)
+    with pytest.raises(LineTrackDesignerError) as e:
+        Track(tiles, orient)
+    assert str(e.value) == 'invalid tile values: 10 at (0, 1), 40 at (1, 0)'
+    with pytest.raises(LineTrackDesignerError) as e:
+        Track(np.full((2, 2), 2), np.array([[0, 4], [-1, 3]]))
+    assert str(e.value) == 'invalid orient values: 4 at (0, 1), -1 at (1, 0)'
+
+
+def test_read_stream(track):
+    # Test reading from file objects, with blank lines and spaces
+    text = '\n3;1 2;1  3;0 \n\n2;0 11;0 2;0\t\n3;2 2;1 3;3\n\n'
+    t = Track.read(io.StringIO(text))
+    assert str(t) == str(track)
+    t = Track.read(io.BytesIO(text.encode()))
+    assert str(t) == str(track)
+
+
+def test_read_errors():
+    # Test line and column numbers in errors
+    with pytest.raises(LineTrackDesignerError) as e:
+        Track.from_string('3;1 2;1\n\n2;0 2;x')
+    assert str(e.value) == "line 3, column 5: invalid cell '2;x'"
+    with pytest.raises(LineTrackDesignerError) as e:
+        Track.from_string('3;1 2;1\n2;0')
+    assert str(e.value) == 'line 2: expected 2 cells, got 1'
+    with pytest.raises(LineTrackDesignerError) as e:
+        Track.from_string('3;1 99999999999999999999;0\n2;0 10;0')
+    assert str(e.value) == ('invalid tile values: 99999999999999999999 at '
+                            '(0, 1), 10 at (1, 1)')
+    with pytest.raises(LineTrackDesignerError):
+        Track.from_string('3;1 2;-99999999999999999999')
+    assert Track.from_string('0003;+1')[0, 0] == (3, 1)
+
+
+def test_read_fast(track_hard, monkeypatch):
+    # The pure Python parser is only used to report the errors
+    big = Track(np.tile(track_hard.tiles, (20, 20)),
+                np.tile(track_hard.orient, (20, 20)))
+    text = '\n' + str(big).replace('\n', ' \r\n\n\t') + '\n'
+
+    def split_lines(text):
+        raise AssertionError('slow path used')
+
+    monkeypatch.setattr(textformat, 'split_lines', split_lines)
+    assert Track.from_string(text) == big
+    assert Track.from_string('+3;-0 0003;1')[0, 1] == (3, 1)
+    assert Track.from_string(' \n').tiles.shape == (0, 0)
+    monkeypatch.undo()
+    for text in ['1;2;3 4', '3;1 2;1\n2;0', '3 ;1', '3;1+2', '3;+-1',
+                 '1_2;3', '3;1 ;2;1', '2;1 3']:
+        with pytest.raises(LineTrackDesignerError) as e:
+            Track.from_string(text)
+        with pytest.raises(LineTrackDesignerError) as ref:
+            textformat.from_string(text)
+        assert str(e.value) == str(ref.value)
+
+
+def test_save_bin(track_hard, tmp_path):
+    # Test binary format
+    file = str(tmp_path / 'track.trk')
+    track_hard.save(file)
+    t = Track.read(file)
+    assert t.name == 'track'
+    assert (t.tiles == track_hard.tiles).all()
+    assert (t.orient == track_hard.orient).all()
+    assert Track.read(file, 'other').name == 'other'
+    with open(file, 'rb') as f:
+        assert str(Track.read(f)) == str(track_hard)
+    with open(file, 'rb') as f:
+        data = f.read()
+    for size in [len(data) - 1, 12]:
+        with pytest.raises(LineTrackDesignerError):
+            Track.read(io.BytesIO(data[:size]))
+    with pytest.raises(LineTrackDesignerError):
+        track_hard.save(str(tmp_path / 'track.bin'))
+    with pytest.raises(LineTrackDesignerError):
+        Track(track_hard.tiles, track_hard.orient, 'x' * 65536).save(file)
+    assert Track.read(file) == track_hard
+
+
+def test_read_bin_lazy(track_hard, tmp_path):
+    # The cells of a binary file are only decoded when they are used
+    file = str(tmp_path / 'track.trk')
+    track_hard.save(file)
+    t = Track.read(file)
+    assert isinstance(t._cells, np.memmap)
+    assert t[1, 2] == track_hard[1, 2]
+    assert (t[1:3, -2:][0] == track_hard.tiles[1:3, -2:]).all()
+    assert t.dimensions() == track_hard.dimensions()
+    assert t.tile_side(500) == track_hard.tile_side(500)
+    png = str(tmp_path / 'track.png')
+    t.save_img(png, 300, streaming=True)
+    with Image.open(png) as img:
+        assert img.tobytes() == track_hard.export_img(300).tobytes()
+    assert '_tiles' not in t.__dict__
+    t.add_col()
+    assert '_cells' not in t.__dict__
+    assert (t.tiles[:, :-1] == track_hard.tiles).all()
+    # The invalid values are reported when the cells are decoded
+    with open(file, 'r+b') as f:
+        f.seek(-1, 2)
+        f.write(bytes([10 << 2]))
+    t = Track.read(file)
+    assert t[0, 0] == track_hard[0, 0]
+    nrow, ncol = track_hard.tiles.shape
+    with pytest.raises(LineTrackDesignerError) as e:
+        t[-1, -2:]
+    assert str(e.value) == 'invalid tile values: 10 at ({}, {})'.format(
+        nrow - 1, ncol - 1)
+    with pytest.raises(LineTrackDesignerError):
+        t.tiles
+
+
+def test_dtype(track, tmp_path):
+    # Test that the arrays are stored as uint8 after each operation
+    def check(t):
+        assert t.tiles.dtype == np.uint8 and t.orient.dtype == np.uint8
+
+    check(track)
+    check(Track.zeros(2, 2))
+    track.add_col()
+    track.add_row()
+    check(track)
+    track.set_tile(5, 5, 33, 3)
+    track.del_col(0)
+    track.rotate(3)
+    check(track)
+    file = str(tmp_path / 'track.trk')
+    track.save(file)
+    check(Track.read(file))
+
+
+def test_growth():
+    # Test building a track cell by cell in reading order
+    track = Track.zeros(0, 0)
+    tiles = np.random.RandomState(0).choice([2, 3, 11], (30, 20))
+    for i in range(30):
+        for j in range(20):
+            track.set_tile(i, j, tiles[i, j], (i + j) % 4)
+    assert track.tiles.shape == (30, 20)
+    assert (track.tiles == tiles).all()
+    assert (track.orient == np.add.outer(range(30), range(20)) % 4).all()
+    # Deleted cells must not come back when the track grows again
+    track.del_row(-1)
+    track.del_col(0)
+    track.add_row()
+    track.add_col()
+    assert (track.tiles[-1] == 0).all() and (track.tiles[:, -1] == 0).all()
+    assert (track.tiles[:29, :19] == tiles[:29, 1:]).all()
+
+
+def test_set_tiles(track):
+    # Test batch edits
+    track.set_tiles([0, 4], [1, 2], [26, 12], 2)
+    assert track.tiles.shape == (5, 3)
+    assert track[0, 1] == (26, 2) and track[4, 2] == (12, 2)
+    with pytest.raises(LineTrackDesignerError) as e:
+        track.set_tiles([0, 1, 2], [0, 1, 7], [3, 10, 40], 0)
+    assert str(e.value) == 'invalid tile values: 10 at (1, 1), 40 at (2, 7)'
+    assert track.tiles.shape == (5, 3) and track[0, 0] == (3, 1)
+
+
+def test_setitem(track):
+    # Test region assignment
+    track[0:2, 1:3] = (np.array([[5, 6], [7, 8]]), 3)
+    assert (track.tiles[0:2, 1:3] == [[5, 6], [7, 8]]).all()
+    assert (track.orient[0:2, 1:3] == 3).all()
+    track[2, :] = (2, 1)
+    tiles, orient = track[2]
+    assert (tiles == 2).all() and (orient == 1).all()
+    with pytest.raises(LineTrackDesignerError):
+        track[0:2, 0:2] = (3, 4)
+    assert track[0, 0] == (3, 1)
+
+
+def test_occurences(track, track_hard):
+    # Test occurences
+    assert track.occurences() == {2: 4, 3: 4, 11: 1}
+    dense = track.occurences(dense=True)
+    assert dense.size == 34 and dense[2] == 4 and dense[0] == 0
+    tracks = [track, Track.zeros(2, 2), track_hard] + [track] * 10
+    assert Track.batch_occurences(tracks) == [
+        t.occurences() for t in tracks]
+    dense = Track.batch_occurences(tracks, dense=True)
+    assert dense.shape == (13, 34) and dense[1, 0] == 4
+
+
+def test_incremental_render(track_hard):
+    # Test that incremental renders match full renders
+    def check(t):
+        full = Track(t.tiles, t.orient).export_img(dpi=5)
+        assert t.export_img(dpi=5, keep=True).tobytes() == full.tobytes()
+
+    check(track_hard)
+    track_hard.set_tile(1, 1, 26, 3)
+    check(track_hard)
+    track_hard[0:2, 0:2] = (5, 1)
+    track_hard.set_tiles([2, 3], [0, 2], 12, 2)
+    check(track_hard)
+    track_hard.add_col()
+    track_hard.add_row()
+    track_hard.set_tile(6, 4, 20, 1)
+    check(track_hard)
+    track_hard.del_row(1)
+    track_hard.del_col(0)
+    check(track_hard)
+    track_hard.rotate(3)
+    check(track_hard)
+
+
+def test_update(track, track_hard):
+    # Test that an update renders the same image as the new track
+    def check(t, other, count):
+        assert t.update(other) == count
+        assert t == Track(other.tiles, other.orient)
+        full = Track(t.tiles, t.orient).export_img(dpi=5)
+        assert t.export_img(dpi=5, keep=True).tobytes() == full.tobytes()
+
+    track_hard.export_img(dpi=5, keep=True)
+    other = Track(track_hard.tiles, track_hard.orient)
+    check(track_hard, other, 0)
+    other.set_tile(1, 2, 26, 3)
+    check(track_hard, other, 1)
+    check(track_hard, track, 7)
+    check(track_hard, other, 13)
+
+
+def test_export_keep(track, tmp_path):
+    # Test that a one-off export or save doesn't keep the image
+    img = track.export_img(300)
+    assert track._render is None
+    track.save_img(str(tmp_path / 'track.png'), 300)
+    assert track._render is None
+    assert track.export_img(300, keep=True).tobytes() == img.tobytes()
+    track.set_tile(0, 0, 5, 0)
+    track.save_img(str(tmp_path / 'track.png'), 300)
+    with Image.open(str(tmp_path / 'track.png')) as saved:
+        assert saved.tobytes() == track.export_img(300, keep=True).tobytes()
+    assert track._render is not None
+
+
+def test_eq_digest(track, track_hard):
+    # Test equality and canonical hash
+    other = Track(track.tiles.astype(int), track.orient, 'other')
+    assert other == track and other.digest() == track.digest()
+    assert track != track_hard and track.digest() != track_hard.digest()
+    other.add_col()
+    other.del_col(-1)
+    assert other == track and other.digest() == track.digest()
+    other.set_tile(0, 0, 3, 2)
+    assert other != track and other.digest() != track.digest()
+
+
+def test_export_img_workers(track_hard):
+    # Test parallel rendering
+    img = Track(track_hard.tiles, track_hard.orient).export_img(300)
+    for workers in [2, 8]:
+        t = Track(track_hard.tiles, track_hard.orient)
+        assert t.export_img(300, workers=workers).tobytes() == img.tobytes()
+    with pytest.raises(LineTrackDesignerError):
+        track_hard.export_img(workers=0)
+
+
+def test_validate_connectivity(track, track_hard):
+    # Test continuity of the line
+    assert track.validate_connectivity().shape == (0, 4)
+    assert track_hard.validate_connectivity().shape == (0, 4)
+    assert track_hard.validate_connectivity(True).shape == (0, 4)
+    track.set_tile(0, 1, 3, 0)
+    assert track.validate_connectivity().tolist() == [
+        [0, 1, 0, 2], [0, 1, 1, 1]]
+    track.set_tile(0, 1, 2, 0)
+    assert track.validate_connectivity(True).tolist() == [
+        [0, 0, 0, 1], [0, 1, -1, 1], [0, 1, 0, 2], [0, 1, 1, 1]]
+    # Empty tracks have no seam
+    track.del_col(0)
+    track.del_col(0)
+    track.del_col(0)
+    assert track.tiles.shape == (3, 0)
+    for t in [track, Track.from_string('')]:
+        assert t.validate_connectivity(True).shape == (0, 4)
+
+
+def test_path_graph(track, track_hard):
+    # Test the line network
+    g = track.path_graph()
+    assert len(g) == 8 and len(g.components()) == 1
+    assert g.loops() == [pytest.approx(4 * 157.1 + 4 * 200)]
+    assert track.path_length() == pytest.approx(g.length())
+    g = track_hard.path_graph()
+    assert g.loops() == []
+    assert [g.node_info(n) for n in g.open_ends()] == [('c', 4, 0, 0)]
+    track.set_tile(1, 1, 8, 0)
+    assert len(track.path_graph().components()) == 3
+    assert Track.zeros(2, 2).path_length() == 0
+
+
+def test_generate():
+    # Test random tracks
+    for seed in range(5):
+        track = Track.generate(8, 6, seed=seed)
+        assert track.tiles.shape == (8, 6)
+        assert track.validate_connectivity(True).shape == (0, 4)
+        assert track == Track.generate(8, 6, seed=seed)
+    track = Track.generate(
+        5, 5, seed=0, constraints={(2, 2): (8, 0)}, tiles=[2, 3, 8])
+    assert track[2, 2] == (8, 0)
+    assert set(np.unique(track.tiles)) <= {2, 3, 8, 11}
+    assert track.validate_connectivity(True).shape == (0, 4)
+    with pytest.raises(LineTrackDesignerError):
+        Track.generate(1, 1, constraints={(0, 0): (2, 0)})
+
+
+def test_fill():
+    # Test the filling of the empty cells
+    track = Track.generate(6, 6, seed=3)
+    holes = Track(track.tiles, track.orient)
+    holes.set_tiles([1, 2, 2, 4], [1, 2, 3, 0], 0, 0)
+    holes.fill(seed=0)
+    assert np.all(holes.tiles != 0)
+    assert holes.validate_connectivity(True).shape == (0, 4)
+    blank = Track.zeros(3, 4)
+    blank.fill(fewest=True)
+    assert np.all(blank.tiles == 11)
+    line = Track.zeros(3, 4)
+    line[1, 1] = (2, 0)
+    line.fill(seed=1, tiles=[2, 3], borders=False)
+    assert line[1, 1] == (2, 0)
+    assert set(np.unique(line.tiles)) <= {2, 3, 11}
+    assert line.validate_connectivity().shape == (0, 4)
+    with pytest.raises(LineTrackDesignerError):
+        Track(np.array([[8, 0]]), np.zeros((1, 2))).fill(tiles=[2])
+
+
+def test_canonical():
+    # Test the canonical forms of the rotated and mirrored tracks
+    track = Track.generate(4, 6, seed=2, tiles=[3, 4, 12, 13, 15])
+    digest = track.canonical_digest(True)
+    for k in range(4):
+        rotated = Track(track.tiles, track.orient)
+        rotated.rotate(k)
+        assert rotated.canonical() == track.canonical()
+        rotated.mirror()
+        assert rotated.validate_connectivity(True).shape == (0, 4)
+        assert rotated.canonical_digest(True) == digest
+    assert Track(np.array([[2]]), np.array([[2]])).canonical() == \
+        Track(np.array([[2]]), np.array([[0]]))
+    with pytest.raises(LineTrackDesignerError):
+        Track(np.array([[24]]), np.array([[0]])).mirror()
+
+
+def test_export_print_pdf(tmp_path):
+    # Test the PDF file of the tiles to print
+    track = Track.read(os.path.join(path, 'track.txt'))
+    file = str(tmp_path / 'track.pdf')
+    cache = RenderCache(tmp_path / 'cache')
+    track.export_print_pdf(file, cache)
+    tiles = PDFReader(os.path.join(
+        os.path.dirname(path), 'line_track_designer', 'pdf',
+        'linefollowtiles.pdf'))
+    pdf = PDFReader(file)
+    pages = [n for n, c in sorted(track.occurences().items())
+             for _ in range(c)]
+    assert len(pdf.pages) == len(pages)
+    for k, number in enumerate(pages):
+        assert pdf.get(pdf.page(k)['Contents']).data == \
+            tiles.get(tiles.page(number - 1)['Contents']).data
+    assert pdf.page(0)['Contents'] == pdf.page(1)['Contents']
+    assert os.path.getsize(file) < os.path.getsize(tiles.filename)
+    os.remove(file)
+    track.export_print_pdf(file, cache)
+    assert len(PDFReader(file).pages) == len(pages)
+    with pytest.raises(LineTrackDesignerError):
+        track.export_print_pdf(str(tmp_path / 'track.png'))
@@ -0,0 +1,14 @@
+from line_track_designer import validation
+from line_track_designer.tile import Tile
+
+
+def test_valid_values():
+    assert validation.VALID_TILES == {0} | {
+        i for i in range(validation.NB_TILES) if Tile.is_valid(i)}
+    assert 10 not in validation.VALID_TILES
+    assert validation.VALID_ORIENT == {0, 1, 2, 3}
+
+
+def test_invalid_values():
+    assert validation.invalid_values('tile', [(10, 0, 1), (40, 1, 0)]) == \
+        'invalid tile values: 10 at (0, 1), 40 at (1, 0)'
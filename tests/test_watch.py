@@ -0,0 +1,96 @@
+import os
+import pytest
+from PIL import Image
+from line_track_designer.track import Track
+from line_track_designer.watch import Watcher
+from line_track_designer.error import LineTrackDesignerError
+
+path = os.path.dirname(os.path.abspath(__file__))
+
+
+def write(file, text):
+    # Move the modification time so the change is seen whatever the clock
+    with open(file, 'w') as f:
+        f.write(text)
+    os.utime(file, ns=(0, os.stat(file).st_mtime_ns + 1))
+
+
+def check(watcher):
+    track = watcher.track
+    full = Track(track.tiles, track.orient).export_img(dpi=watcher.dpi)
+    with Image.open(watcher.output) as img:
+        assert img.tobytes() == full.tobytes()
+
+
+def test_watcher(tmp_path, monkeypatch):
+    file = tmp_path / 'track.txt'
+    with open(os.path.join(path, 'track_hard.txt')) as f:
+        text = f.read()
+    write(file, text)
+    watcher = Watcher(file, dpi=5)
+    assert watcher.output == tmp_path / 'track.png'
+    assert watcher.changed()
+    assert watcher.update() == watcher.track.tiles.size
+    assert not watcher.changed()
+    check(watcher)
+    track = Track.from_string(text)
+    track.set_tile(0, 1, 26, 3)
+    write(file, str(track))
+    assert watcher.changed() and watcher.update() == 1
+    check(watcher)
+    # Only the cells of the new column are rendered
+    pasted = []
+    paste = Track._paste
+
+    def count(self, img, side, rows, cols, *args):
+        pasted.extend(rows)
+        return paste(self, img, side, rows, cols, *args)
+
+    monkeypatch.setattr(Track, '_paste', count)
+    track.add_col()
+    track.set_tile(0, track.tiles.shape[1] - 1, 5, 1)
+    write(file, str(track))
+    assert watcher.update() == 1
+    assert len(pasted) == track.tiles.shape[0]
+    check(watcher)
+    with pytest.raises(LineTrackDesignerError):
+        Watcher(file, tmp_path / 'track.jpg')
+    with pytest.raises(LineTrackDesignerError):
+        Watcher(file, dpi=0)
+
+
+def test_watch_errors(tmp_path):
+    file = tmp_path / 'track.txt'
+    write(file, '3;1 2;1\n2;0 11;0')
+    watcher = Watcher(file, dpi=2)
+    results = []
+    watcher.watch(0, results.append, lambda: len(results) >= 1)
+    assert results == [4]
+    write(file, '3;1 2;1\n2;0 x')
+    watcher.watch(0, results.append, lambda: len(results) >= 2)
+    assert isinstance(results[1], LineTrackDesignerError)
+    assert str(watcher.track) == '3;1 2;1\n2;0 11;0'
+    check(watcher)
+
+
+def test_watch_invalid_start(tmp_path):
+    # An invalid file is reported once, and read again when it changes
+    file = tmp_path / 'track.txt'
+    write(file, '3;1 2;x')
+    watcher = Watcher(file, dpi=2)
+    results, ticks = [], []
+
+    def stop():
+        ticks.append(None)
+        return len(ticks) > 5
+
+    watcher.watch(0, results.append, stop)
+    assert len(results) == 1 and watcher.track is None
+    assert isinstance(results[0], LineTrackDesignerError)
+    write(file, '3;1 2;1')
+    ticks.clear()
+    watcher.watch(0, results.append, stop)
+    assert results[1:] == [2]
+    umask = os.umask(0)
+    os.umask(umask)
+    assert watcher.output.stat().st_mode & 0o777 == 0o666 & ~umask